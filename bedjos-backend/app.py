@@ -1,6 +1,10 @@
 from app import create_app
+from app.schema import check_schema
 
 app = create_app()
 
 if __name__ == "__main__":
+    # Set up a new database first with `flask --app app bedjos init-db`
+    with app.app_context():
+        check_schema()
     app.run(debug=True)
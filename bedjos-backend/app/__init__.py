@@ -1,15 +1,29 @@
+import os
+import time
+
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import Config
 
 db = SQLAlchemy()
 jwt = JWTManager()
+migrate = Migrate()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
 
 def create_app():
+    """
+    Build the app without touching the database, so worker boots stay fast.
+    Schema setup and seeding are `flask bedjos init-db`; servers check the schema once at startup.
+    """
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(Config)
+    from .json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
 
     # Allow frontend from Vercel and localhost
     CORS(app, origins=[
@@ -21,12 +35,24 @@ def create_app():
         "http://localhost:3000"
     ])
 
+    if app.config["TRUSTED_PROXIES"]:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        proxies = app.config["TRUSTED_PROXIES"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
     db.init_app(app)
     jwt.init_app(app)
+    from .schema import include_object
+    migrate.init_app(
+        app, db, directory=MIGRATIONS_DIR, include_object=include_object, render_as_batch=True
+    )
 
     from .routes import api
     app.register_blueprint(api, url_prefix="/api")
 
+    from .cli import bedjos
+    app.cli.add_command(bedjos)
+
     # Root route
     @app.route("/", methods=["GET"])
     def root():
@@ -43,14 +69,20 @@ def create_app():
         }), 200
 
     with app.app_context():
-        db.create_all()
-        # Create default admin if none exists
-        from .models import Admin
-        if not Admin.query.filter_by(email="admin@bedjos.co.ke").first():
-            admin = Admin(email="admin@bedjos.co.ke")
-            admin.set_password("Admin@123")
-            db.session.add(admin)
-            db.session.commit()
-            print("✅ Default admin created: admin@bedjos.co.ke / Admin@123")
+        from .sql import configure_engine
+        configure_engine(app)
+        if app.config["METRICS_ENABLED"]:
+            from .metrics import init_metrics
+            init_metrics(app)
+
+    if app.config["MAIL_OUTBOX_WORKER"]:
+        from .mailer import start_outbox_worker
+        start_outbox_worker(app)
+
+    if app.config["CART_COMPACTION_WORKER"]:
+        from .cart import start_cart_compactor
+        start_cart_compactor(app)
 
+    app.config["STARTUP_SECONDS"] = time.perf_counter() - started
+    app.logger.info("App created in %.1f ms", app.config["STARTUP_SECONDS"] * 1000)
     return app
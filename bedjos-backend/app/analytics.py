@@ -0,0 +1,171 @@
+from datetime import date, datetime, timedelta
+
+from . import db
+from .cache import bump_generation_after_commit, generation, get_cache
+from .json_provider import dumps, loads
+from .models import Order, OrderItem, Product
+from .pagination import created_between
+
+INTERVALS = ("day", "week", "month")
+GROUPS = ("status", "category")
+DEFAULT_SPAN = {"day": 30, "week": 26, "month": 24}
+MAX_BUCKETS = 1500
+
+# Closed (past) buckets only change when an order in them is updated or a product
+# changes category, so their rows are kept in the shared cache, one entry per
+# interval and group mapping bucket starts to rows. Entries are keyed by the
+# group's generation, which writes bump once they commit. With the per-process
+# "memory" backend the TTL is capped at CACHE_LOCAL_MAX_TTL instead.
+CLOSED_BUCKETS_TTL_SECONDS = 24 * 3600
+
+
+def bucket_start(value, interval):
+    day = value.date() if isinstance(value, datetime) else value
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, interval):
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def bucket_starts(first, last, interval):
+    starts = []
+    current = bucket_start(first, interval)
+    while current <= last:
+        starts.append(current)
+        if len(starts) > MAX_BUCKETS:
+            raise ValueError(f"At most {MAX_BUCKETS} buckets per request")
+        current = next_bucket(current, interval)
+    return starts
+
+
+def bucket_expression(interval):
+    """SQL expression giving each order's bucket start as 'YYYY-MM-DD' (UTC)."""
+    if db.engine.dialect.name == "postgresql":
+        return db.func.to_char(db.func.date_trunc(interval, Order.created_at), "YYYY-MM-DD")
+    if interval == "week":
+        # Next Sunday (or today, if Sunday), back six days: the Monday of the week
+        return db.func.date(Order.created_at, "weekday 0", "-6 days")
+    if interval == "month":
+        return db.func.strftime("%Y-%m-01", Order.created_at)
+    return db.func.date(Order.created_at)
+
+
+def query_buckets(interval, group, start, end):
+    """One grouped query over orders created in [start, end)."""
+    bucket = bucket_expression(interval).label("bucket")
+    if group == "category":
+        key = db.func.coalesce(Product.category, "Uncategorized")
+        query = (
+            db.select(
+                bucket, key,
+                db.func.count(db.distinct(Order.id)),
+                db.func.sum(OrderItem.price * OrderItem.quantity)
+            )
+            .select_from(Order)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(Product, Product.id == OrderItem.product_id)  # a missing product is "Uncategorized"
+        )
+    elif group == "status":
+        key = Order.status
+        query = db.select(bucket, key, db.func.count(Order.id), db.func.sum(Order.total))
+    else:
+        key = None
+        query = db.select(bucket, db.func.count(Order.id), db.func.sum(Order.total))
+
+    query = created_between(query, Order.created_at, start, end)
+    group_by = (bucket, key) if key is not None else (bucket,)
+    rows = db.session.execute(query.group_by(*group_by)).all()
+
+    results = {}
+    for row in rows:
+        if key is not None:
+            bucket_key, group_key, orders, revenue = row
+            entry = {"key": group_key, "orders": orders, "revenue": float(revenue or 0)}
+        else:
+            bucket_key, orders, revenue = row
+            entry = {"orders": orders, "revenue": float(revenue or 0)}
+        results.setdefault(date.fromisoformat(bucket_key), []).append(entry)
+    return results
+
+
+def sales_series(interval, group, first, last, today=None):
+    """
+    Revenue and order counts per bucket from `first` to `last` (inclusive dates).
+    Only buckets not already cached, including the still-open current one, are queried.
+    """
+    today = today or datetime.utcnow().date()
+    open_bucket = bucket_start(today, interval)
+    starts = bucket_starts(first, last, interval)
+
+    cache = get_cache()
+    version = generation(_generation_name(group))
+    cache_key = f"analytics:{version}:{interval}:{group or 'total'}"
+    cached = cache.get(cache_key)
+    closed = loads(cached) if cached is not None else {}
+
+    by_start = {}
+    missing_from = None
+    for start in starts:
+        rows = closed.get(start.isoformat())
+        if rows is None:
+            missing_from = start
+            break
+        by_start[start] = rows
+
+    if missing_from is not None:
+        # Everything from the first uncached bucket onwards comes from one grouped query
+        fresh = query_buckets(
+            interval, group,
+            datetime.combine(missing_from, datetime.min.time()),
+            datetime.combine(next_bucket(starts[-1], interval), datetime.min.time())
+        )
+        added = False
+        for start in starts:
+            if start < missing_from:
+                continue
+            by_start[start] = fresh.get(start, [])
+            if start < open_bucket:
+                closed[start.isoformat()] = by_start[start]
+                added = True
+        # Don't store rows read while a write was being committed
+        if added and generation(_generation_name(group)) == version:
+            cache.set(cache_key, dumps(closed), CLOSED_BUCKETS_TTL_SECONDS)
+
+    series = []
+    for start in starts:
+        rows = by_start[start]
+        if group is None:
+            totals = rows[0] if rows else {"orders": 0, "revenue": 0.0}
+            series.append({"bucket": start.isoformat(), **totals})
+        else:
+            series.extend({"bucket": start.isoformat(), **row} for row in rows)
+    return series
+
+
+def default_first(last, interval):
+    first = bucket_start(last, interval)
+    for _ in range(DEFAULT_SPAN[interval] - 1):
+        first = bucket_start(first - timedelta(days=1), interval)
+    return first
+
+
+def _generation_name(group):
+    return f"analytics:{group or 'total'}"
+
+
+def invalidate_analytics(group=None):
+    """
+    Drop the cached buckets of one group (all of them if None) when the caller's
+    transaction commits.
+    """
+    groups = (None,) + GROUPS if group is None else (group,)
+    bump_generation_after_commit(db.session, *(_generation_name(g) for g in groups))
@@ -0,0 +1,223 @@
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import create_access_token, decode_token
+from flask_jwt_extended.exceptions import NoAuthorizationError, RevokedTokenError, WrongTokenError
+from itsdangerous import BadData, URLSafeTimedSerializer
+from jwt import get_unverified_header
+from sqlalchemy.exc import IntegrityError
+
+from . import db, jwt
+from .cache import bump_generation, get_cache
+from .models import Admin, Customer, RevokedToken
+
+ROLES = {"admin": Admin, "customer": Customer}
+MAX_CACHED_IDENTITIES = 4096
+PURGE_PROBABILITY = 0.01
+PURGE_BATCH = 500
+STREAM_TICKET_SALT = "bedjos-events-stream"
+
+# Decoded, checked identities keyed by sha256 of the raw token. A hit skips signature
+# verification and the user query. Entries live for JWT_IDENTITY_CACHE_SECONDS at most
+# (never past the token's expiry). Revocations apply at once in every worker: with a
+# shared cache each logout bumps the "revocations" generation, and a hit is only used
+# while that generation is unchanged; with the per-process cache a hit still looks the
+# token up in revoked_token.
+_lock = threading.Lock()
+_identities = OrderedDict()
+_revoked = {}  # jti -> expiry (unix time) of tokens revoked through this process
+
+
+def issue_token(user, role):
+    return create_access_token(identity=str(user.id), additional_claims={"role": role})
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _token_from_header():
+    header = request.headers.get("Authorization")
+    if not header:
+        raise NoAuthorizationError("Missing Authorization Header")
+    scheme, _, token = header.partition(" ")
+    if scheme != current_app.config["JWT_HEADER_TYPE"] or not token:
+        raise NoAuthorizationError(
+            f"Bad Authorization header. Expected 'Authorization: {current_app.config['JWT_HEADER_TYPE']} <JWT>'"
+        )
+    return token.strip()
+
+
+def _is_revoked(jti):
+    if jti in _revoked:
+        return True
+    return db.session.get(RevokedToken, jti) is not None
+
+
+def _revocations_marker():
+    """The shared revocations generation, or None when it can't be relied on."""
+    cache = get_cache()
+    if not cache.shared:
+        return None
+    value = cache.get("gen:revocations")
+    if value is None:
+        # Not set yet, or the cache is down (then this returns None too)
+        value = bump_generation("revocations")
+    return None if value is None else int(value)
+
+
+def _cached(key, marker):
+    """The cached identity for a token, or None if there is none or it may have been revoked since."""
+    with _lock:
+        entry = _identities.get(key)
+        if entry is None:
+            return None
+        expires, identity, cached_marker = entry
+        if (
+            expires <= time.monotonic() or identity["jti"] in _revoked
+            or (marker is not None and marker != cached_marker)
+        ):
+            del _identities[key]
+            return None
+        _identities.move_to_end(key)
+    if marker is None and _is_revoked(identity["jti"]):
+        # No shared revocation signal: ask the database
+        return None
+    return identity
+
+
+def _load_identity(token):
+    """Full check of a token: signature, expiry, type, blocklist and the user it names."""
+    data = decode_token(token)
+    if data.get("type") != "access":
+        raise WrongTokenError("Only non-refresh tokens are allowed")
+    if _is_revoked(data["jti"]):
+        raise RevokedTokenError(get_unverified_header(token), data)
+
+    model = ROLES.get(data.get("role"))
+    user = db.session.get(model, int(data["sub"])) if model else None
+    if user is None:
+        # Tokens issued before roles existed, or for a deleted account
+        raise NoAuthorizationError("Token does not identify a current user; please log in again")
+    return {
+        "id": user.id,
+        "email": user.email,
+        "role": data["role"],
+        "jti": data["jti"],
+        "exp": data.get("exp"),
+    }
+
+
+def authenticate(token=None):
+    """Return the identity for the request's bearer token, from the cache when possible."""
+    token = token or _token_from_header()
+    key = _token_hash(token)
+    marker = _revocations_marker()
+    identity = _cached(key, marker)
+    if identity is not None:
+        return identity
+
+    identity = _load_identity(token)
+    ttl = current_app.config["JWT_IDENTITY_CACHE_SECONDS"]
+    if identity["exp"] is not None:
+        ttl = min(ttl, identity["exp"] - time.time())
+    if ttl > 0:
+        with _lock:
+            _identities[key] = (time.monotonic() + ttl, identity, marker)
+            while len(_identities) > MAX_CACHED_IDENTITIES:
+                _identities.popitem(last=False)
+    return identity
+
+
+def _ticket_serializer():
+    return URLSafeTimedSerializer(current_app.config["JWT_SECRET_KEY"], salt=STREAM_TICKET_SALT)
+
+
+def issue_stream_ticket(identity):
+    """
+    A short-lived ticket that only opens /api/events. EventSource can't send headers,
+    so the stream is opened with this in the URL instead of the bearer token.
+    """
+    return _ticket_serializer().dumps({"id": identity["id"], "role": identity["role"], "jti": identity["jti"]})
+
+
+def redeem_stream_ticket(ticket):
+    """The identity a ticket was issued to, or None if it is invalid, expired or its token was revoked."""
+    try:
+        data = _ticket_serializer().loads(ticket, max_age=current_app.config["EVENTS_TICKET_SECONDS"])
+    except BadData:
+        return None
+    if _is_revoked(data["jti"]):
+        return None
+    return data
+
+
+def current_identity():
+    return g.identity
+
+
+def auth_required(role=None):
+    """
+    Like `jwt_required()`, backed by the identity cache. Errors go through the
+    JWT extension's handlers, so clients see the same responses as before.
+    With `role`, other roles get a 403.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.identity = authenticate()
+            if role is not None and g.identity["role"] != role:
+                return jsonify({"error": f"{role.capitalize()} access required"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+admin_required = auth_required("admin")
+
+
+def revoke_token(token=None):
+    """Blocklist a token (by default the request's) until it expires. Raises the JWT errors if it is invalid."""
+    token = token or _token_from_header()
+    identity = authenticate(token)
+    expires_at = (
+        datetime.fromtimestamp(identity["exp"], timezone.utc).replace(tzinfo=None)
+        if identity["exp"] is not None else None
+    )
+    with _lock:
+        _revoked[identity["jti"]] = identity["exp"] or float("inf")
+        _identities.pop(_token_hash(token), None)
+        now = time.time()
+        for jti in [jti for jti, exp in _revoked.items() if exp <= now]:
+            del _revoked[jti]
+
+    db.session.add(RevokedToken(jti=identity["jti"], expires_at=expires_at))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Already revoked
+        db.session.rollback()
+    # After the commit, so a worker that reloads the identity finds the row
+    bump_generation("revocations")
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired_revocations()
+
+
+def purge_expired_revocations(now=None):
+    expired = db.select(RevokedToken.jti).where(
+        RevokedToken.expires_at < (now or datetime.utcnow())
+    ).limit(PURGE_BATCH)
+    db.session.execute(db.delete(RevokedToken).where(RevokedToken.jti.in_(expired)))
+    db.session.commit()
+
+
+@jwt.token_in_blocklist_loader
+def token_in_blocklist(jwt_header, jwt_payload):
+    # Covers any route still using the extension's own jwt_required()
+    return _is_revoked(jwt_payload["jti"])
@@ -0,0 +1,307 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# One interface, three backends, all storing bytes:
+#   get(key) -> bytes | None, set(key, value, ttl=None), delete(*keys), incr(key) -> int, stats()
+# "memory" is per process; "redis" is shared by every worker; "near" keeps a small
+# local tier in front of Redis and invalidates it across processes with pub/sub.
+# Only "redis" and "near" are shared: with "memory", a write invalidates the cache of
+# the worker that made it and no other, so entries there are kept briefly (max_ttl)
+# and per-user data such as carts is not cached at all (see `shared`).
+INVALIDATION_CHANNEL = "bedjos:cache:invalidate"
+# After a Redis error, skip Redis for this long instead of waiting on it per request
+REDIS_RETRY_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache:
+    """
+    In-process LRU with a TTL per entry and a bound on the number of entries.
+    `max_ttl`, when set, caps every entry's TTL (including "no expiry").
+    """
+
+    shared = False
+
+    def __init__(self, max_entries=4096, default_ttl=300, max_ttl=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        # Counters are kept apart so LRU eviction can never reset a generation
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.counters:
+                self.hits += 1
+                return str(self.counters[key]).encode("ascii")
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if self.max_ttl:
+            ttl = min(ttl, self.max_ttl) if ttl else self.max_ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+                self.counters.pop(key, None)
+
+    def incr(self, key):
+        with self.lock:
+            value = self.counters.get(key, 0) + 1
+            self.counters[key] = value
+            return value
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self.entries),
+        }
+
+
+class RedisCache:
+    """
+    Shared cache on any Redis-protocol server. Eviction is the server's job: use
+    maxmemory-policy volatile-lru, so only entries with a TTL go and the generation
+    counters (which have none) survive. `evictions` reports the server's evicted_keys.
+
+    While Redis is unreachable, reads miss and writes are dropped, so callers fall
+    through to the database (or, in a NearCache, the local tier) instead of failing.
+    """
+
+    shared = True
+
+    def __init__(self, url, default_ttl=300, prefix="bedjos:cache:"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.redis_errors = (redis.RedisError, OSError)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.hits = self.misses = self.errors = 0
+        self.down_until = 0
+
+    def _call(self, default, method, *args, **kwargs):
+        if self.down_until > time.monotonic():
+            return default
+        try:
+            return method(*args, **kwargs)
+        except self.redis_errors as e:
+            self.errors += 1
+            self.down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            logger.warning("Redis cache unavailable, bypassing it for %ds: %s", REDIS_RETRY_SECONDS, e)
+            return default
+
+    def get(self, key):
+        value = self._call(None, self.redis.get, self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._call(None, self.redis.set, self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self._call(None, self.redis.delete, *[self.prefix + key for key in keys])
+
+    def incr(self, key):
+        """The new counter value, or None when Redis is unavailable."""
+        return self._call(None, self.redis.incr, self.prefix + key)
+
+    def publish(self, channel, message):
+        self._call(None, self.redis.publish, channel, message)
+
+    def listen(self, channel, callback):
+        """Call `callback(message)` for each message on `channel`, in a daemon thread."""
+        def run():
+            while True:
+                try:
+                    pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(channel)
+                    for message in pubsub.listen():
+                        callback(message["data"])
+                except Exception:
+                    time.sleep(1)
+
+        thread = threading.Thread(target=run, name="cache-invalidation", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        try:
+            evictions = self.redis.info("stats").get("evicted_keys")
+        except Exception:
+            evictions = None
+        return {
+            "backend": "redis", "hits": self.hits, "misses": self.misses, "evictions": evictions,
+            "errors": self.errors
+        }
+
+
+class NearCache:
+    """
+    A small local tier in front of a shared one. Reads try local first. Writes and
+    deletes go to both and publish the key, so other processes drop their local copy;
+    the short local TTL bounds staleness if an invalidation is ever missed.
+    """
+
+    shared = True
+
+    def __init__(self, local, remote, local_ttl=5):
+        self.local = local
+        self.remote = remote
+        self.local_ttl = local_ttl
+        self.origin = uuid.uuid4().hex.encode("ascii")
+        self.remote.listen(INVALIDATION_CHANNEL, self._on_invalidate)
+
+    def _on_invalidate(self, message):
+        origin, _, key = message.partition(b" ")
+        if origin != self.origin:
+            self.local.delete(key.decode("utf-8"))
+
+    def _invalidate_others(self, key):
+        self.remote.publish(INVALIDATION_CHANNEL, self.origin + b" " + key.encode("utf-8"))
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.remote.get(key)
+            if value is not None:
+                self.local.set(key, value, self.local_ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.remote.set(key, value, ttl)
+        self.local.set(key, value, min(self.local_ttl, ttl) if ttl else self.local_ttl)
+        self._invalidate_others(key)
+
+    def delete(self, *keys):
+        self.remote.delete(*keys)
+        self.local.delete(*keys)
+        for key in keys:
+            self._invalidate_others(key)
+
+    def incr(self, key):
+        value = self.remote.incr(key)
+        if value is None:
+            # Remote down: local entries still expire within local_ttl
+            self.local.delete(key)
+            return None
+        self.local.set(key, str(value).encode("ascii"), self.local_ttl)
+        self._invalidate_others(key)
+        return value
+
+    def stats(self):
+        return {"backend": "near", "local": self.local.stats(), "remote": self.remote.stats()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _reset_cache():
+    global _cache
+    _cache = None
+
+
+# Connections and listener threads don't survive a fork
+os.register_at_fork(after_in_child=_reset_cache)
+
+
+def build_cache(config):
+    backend = config["CACHE_BACKEND"]
+    if backend == "memory":
+        return MemoryCache(config["CACHE_MAX_ENTRIES"], config["CACHE_DEFAULT_TTL"], config["CACHE_LOCAL_MAX_TTL"])
+    local = MemoryCache(config["CACHE_MAX_ENTRIES"], config["CACHE_DEFAULT_TTL"])
+    remote = RedisCache(config["CACHE_URL"], config["CACHE_DEFAULT_TTL"])
+    if backend == "redis":
+        return remote
+    if backend == "near":
+        return NearCache(local, remote, config["CACHE_NEAR_TTL"])
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r}")
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        from flask import current_app
+
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_cache(current_app.config)
+    return _cache
+
+
+def generation(name):
+    """A counter that namespaces a family of keys; bumping it invalidates them all at once."""
+    value = get_cache().get(f"gen:{name}")
+    return int(value) if value is not None else 0
+
+
+def bump_generation(name):
+    return get_cache().incr(f"gen:{name}")
+
+
+def invalidate_after_commit(session, *keys):
+    """Delete cache keys once the session's transaction commits (not at all on rollback)."""
+    session.info.setdefault("cache_invalidations", set()).update(keys)
+
+
+def bump_generation_after_commit(session, *names):
+    """Bump generations once the session's transaction commits (not at all on rollback)."""
+    session.info.setdefault("cache_generation_bumps", set()).update(names)
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_after_commit(session):
+    keys = session.info.pop("cache_invalidations", None)
+    if keys:
+        get_cache().delete(*keys)
+    for name in session.info.pop("cache_generation_bumps", ()):
+        bump_generation(name)
+
+
+# after_soft_rollback also fires when the transaction never reached the database;
+# a savepoint rolling back leaves the outer transaction's invalidations pending
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop("cache_invalidations", None)
+        session.info.pop("cache_generation_bumps", None)
@@ -0,0 +1,278 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from . import db
+from .cache import generation, get_cache, invalidate_after_commit
+from .json_provider import dumps
+from .models import CartItem, Product
+from .serializers import CART_ITEM_FIELDS, serialize_rows
+from .sql import upsert_insert
+
+CART_OPERATIONS = ("add", "set", "remove")
+MAX_BATCH_OPERATIONS = 100
+CART_TTL_SECONDS = 300
+# Short transactions with a pause between them, so compaction never holds the
+# SQLite write lock for long and cart writes interleave with it
+COMPACTION_BATCH_SIZE = 500
+COMPACTION_PAUSE_SECONDS = 0.05
+
+_compactor = None
+
+
+def _reset_compactor():
+    global _compactor
+    _compactor = None
+
+
+# Threads don't survive a fork; a forked process starts its own compactor
+os.register_at_fork(after_in_child=_reset_compactor)
+
+
+def load_cart(session_id):
+    """Read a cart and its products in one joined query."""
+    rows = db.session.execute(
+        db.select(
+            CartItem.id, CartItem.product_id, Product.name, Product.price, Product.image,
+            CartItem.quantity, (Product.price * CartItem.quantity).label("item_total")
+        )
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.session_id == session_id)
+        .order_by(CartItem.id)
+    ).all()
+
+    return {
+        "items": serialize_rows(CART_ITEM_FIELDS, rows),
+        "total": sum(row.item_total for row in rows),
+        "count": len(rows)
+    }
+
+
+def cart_key(session_id):
+    # Product edits and stock changes bump the catalog generation, which retires cached carts too
+    return f"cart:{generation('catalog')}:{session_id}"
+
+
+def cached_cart(session_id):
+    """The cart as a JSON body, from the cache when it is shared by every worker."""
+    cache = get_cache()
+    if not cache.shared:
+        # Another worker's write would leave this one serving the old cart
+        return dumps(load_cart(session_id))
+    key = cart_key(session_id)
+    body = cache.get(key)
+    if body is None:
+        body = dumps(load_cart(session_id))
+        cache.set(key, body, CART_TTL_SECONDS)
+    return body
+
+
+def invalidate_cart(session_id):
+    """Drop the cached cart when the current transaction commits."""
+    invalidate_after_commit(db.session, cart_key(session_id))
+
+
+def touch_cart(session_id):
+    """Mark every line of a cart as active, so expiry takes the cart as a whole."""
+    db.session.execute(
+        db.update(CartItem)
+        .where(CartItem.session_id == session_id)
+        .values(last_touched=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def add_cart_item(session_id, product_id, quantity):
+    """
+    Insert a cart line or add to its quantity in a single statement.
+    The product check is folded into INSERT ... SELECT, so an unknown product
+    inserts nothing. Returns False in that case.
+    """
+    insert = upsert_insert(CartItem.__table__)
+    stmt = insert.from_select(
+        ["session_id", "product_id", "quantity"],
+        db.select(
+            db.literal(session_id, db.String), Product.id, db.literal(quantity, db.Integer)
+        ).where(Product.id == product_id)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["session_id", "product_id"],
+        set_={"quantity": CartItem.quantity + stmt.excluded.quantity}
+    )
+    if db.session.execute(stmt).rowcount == 0:
+        return False
+    touch_cart(session_id)
+    return True
+
+
+def parse_cart_operations(operations):
+    """
+    Validate a batch and fold it into one net change per product:
+    ("add", n) increments the current quantity, ("set", n) replaces it and
+    ("set", 0) removes the line. Raises ValueError with a client-facing message.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+
+    changes = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get("op") not in CART_OPERATIONS:
+            raise ValueError(f"Operation {index}: op must be one of {', '.join(CART_OPERATIONS)}")
+        product_id = operation.get("product_id")
+        if not isinstance(product_id, int):
+            raise ValueError(f"Operation {index}: product_id required")
+
+        op = operation["op"]
+        if op == "remove":
+            changes[product_id] = ("set", 0)
+            continue
+
+        quantity = operation.get("quantity", 1)
+        if not isinstance(quantity, int) or quantity < (1 if op == "add" else 0):
+            raise ValueError(f"Operation {index}: invalid quantity")
+        kind, current = changes.get(product_id, ("add", 0))
+        if op == "set":
+            changes[product_id] = ("set", quantity)
+        else:
+            changes[product_id] = (kind, current + quantity)
+    return changes
+
+
+def apply_cart_changes(session_id, changes):
+    """
+    Apply folded changes in the caller's transaction: one IN query to validate
+    products, then at most one statement each for increments, sets and removals.
+    Returns the ids of unknown products; nothing is written if there are any.
+    """
+    wanted = [product_id for product_id, (kind, quantity) in changes.items()
+              if kind == "add" or quantity > 0]
+    found = set(db.session.execute(
+        db.select(Product.id).where(Product.id.in_(wanted))
+    ).scalars()) if wanted else set()
+    missing = sorted(set(wanted) - found)
+    if missing:
+        return missing
+
+    adds, sets, removals = [], [], []
+    for product_id, (kind, quantity) in changes.items():
+        row = {"session_id": session_id, "product_id": product_id, "quantity": quantity}
+        if kind == "add":
+            adds.append(row)
+        elif quantity > 0:
+            sets.append(row)
+        else:
+            removals.append(product_id)
+
+    table = CartItem.__table__
+    if adds:
+        stmt = upsert_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id", "product_id"],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity}
+        )
+        db.session.execute(stmt, adds)
+    if sets:
+        stmt = upsert_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id", "product_id"],
+            set_={"quantity": stmt.excluded.quantity}
+        )
+        db.session.execute(stmt, sets)
+    if removals:
+        db.session.execute(
+            db.delete(CartItem)
+            .where(CartItem.session_id == session_id, CartItem.product_id.in_(removals))
+        )
+    touch_cart(session_id)
+    return []
+
+
+def _freelist_bytes():
+    page_size = db.session.execute(db.text("PRAGMA page_size")).scalar()
+    return db.session.execute(db.text("PRAGMA freelist_count")).scalar() * page_size
+
+
+def compact_carts(older_than, batch_size=COMPACTION_BATCH_SIZE, pause=COMPACTION_PAUSE_SECONDS):
+    """
+    Delete carts not touched for `older_than` (a timedelta), one committed batch at a time.
+    Returns {"rows", "batches", "bytes"}: bytes is the space freed for reuse (SQLite
+    freelist growth; tuple sizes on PostgreSQL, reclaimed by the next VACUUM), or None.
+    """
+    cutoff = datetime.utcnow() - older_than
+    dialect = db.engine.dialect.name
+    freelist_before = _freelist_bytes() if dialect == "sqlite" else None
+    rows = batches = tuple_bytes = 0
+
+    while True:
+        expired = (
+            db.select(CartItem.id)
+            .where(CartItem.last_touched < cutoff)
+            .order_by(CartItem.last_touched)
+            .limit(batch_size)
+        )
+        stmt = db.delete(CartItem).where(CartItem.id.in_(expired)).execution_options(synchronize_session=False)
+        if dialect == "postgresql":
+            sizes = db.session.execute(
+                stmt.returning(db.func.pg_column_size(db.literal_column("cart_item.*")))
+            ).scalars().all()
+            deleted = len(sizes)
+            tuple_bytes += sum(sizes)
+        else:
+            deleted = db.session.execute(stmt).rowcount
+        db.session.commit()
+        rows += deleted
+        batches += 1
+        if deleted < batch_size:
+            break
+        time.sleep(pause)
+
+    if dialect == "sqlite":
+        reclaimed = max(0, _freelist_bytes() - freelist_before)
+    elif dialect == "postgresql":
+        reclaimed = tuple_bytes
+    else:
+        reclaimed = None
+    return {"rows": rows, "batches": batches, "bytes": reclaimed}
+
+
+class CartCompactor(threading.Thread):
+    """Runs compact_carts every CART_COMPACTION_INTERVAL_SECONDS inside a web process."""
+
+    def __init__(self, app):
+        super().__init__(name="cart-compaction", daemon=True)
+        self.app = app
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        config = self.app.config
+        while not self.stopped.is_set():
+            with self.app.app_context():
+                try:
+                    result = compact_carts(
+                        timedelta(days=config["CART_EXPIRY_DAYS"]), config["CART_COMPACTION_BATCH_SIZE"]
+                    )
+                    if result["rows"]:
+                        self.app.logger.info(
+                            "Compacted carts: %d row(s) in %d batch(es), %s bytes reclaimed",
+                            result["rows"], result["batches"], result["bytes"]
+                        )
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Cart compaction failed")
+                finally:
+                    db.session.remove()
+            self.stopped.wait(config["CART_COMPACTION_INTERVAL_SECONDS"])
+
+
+def start_cart_compactor(app):
+    global _compactor
+    if _compactor is None:
+        _compactor = CartCompactor(app)
+        _compactor.start()
+    return _compactor
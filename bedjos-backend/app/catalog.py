@@ -0,0 +1,122 @@
+import hashlib
+
+from flask import Response, request
+
+from . import db
+from .cache import bump_generation, generation, get_cache
+from .json_provider import dumps
+from .models import Product
+from .pagination import keyset_page, split_page
+from .serializers import PRODUCT_FIELDS, select_fields, serialize_rows
+
+# Serialized catalog responses live in the shared cache under the current catalog
+# generation. Every product write bumps it, which retires all entries at once.
+# With the per-process "memory" backend other workers miss the bump, so there the
+# TTL is capped at CACHE_LOCAL_MAX_TTL instead.
+CATALOG_TTL_SECONDS = 3600
+
+
+def bump_catalog_version():
+    bump_generation("catalog")
+
+
+def cached_catalog_entry(key, build):
+    """
+    Return (body, etag) for a catalog key, building and caching it if needed.
+    `build` returns a JSON-serializable payload, or None when there is nothing to serve.
+    """
+    cache = get_cache()
+    version = generation("catalog")
+    # Keys embed client input (search text, filters), so store them hashed
+    cache_key = f"catalog:{version}:{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}"
+    entry = cache.get(cache_key)
+    if entry is not None:
+        # Stored as the 32-character ETag followed by the body
+        return entry[32:], entry[:32].decode("ascii")
+
+    payload = build()
+    if payload is None:
+        return None
+
+    body = dumps(payload)
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    # Don't store a payload that was built while a write was in flight
+    if generation("catalog") == version:
+        cache.set(cache_key, etag.encode("ascii") + body, CATALOG_TTL_SECONDS)
+    return body, etag
+
+
+def catalog_response(body, etag, status=200):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, status=status, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, no-cache"
+    return response
+
+
+def parse_product_query(args):
+    """Validate the listing query string. Raises ValueError with a client-facing message."""
+    fields = PRODUCT_FIELDS
+    if args.get("fields"):
+        requested = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in requested if f not in PRODUCT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # id is always returned; it is the pagination key
+        fields = ("id",) + tuple(f for f in PRODUCT_FIELDS if f in requested and f != "id")
+
+    price_range = []
+    for name in ("min_price", "max_price"):
+        value = args.get(name)
+        if value is None:
+            price_range.append(None)
+            continue
+        try:
+            price_range.append(float(value))
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    sort = args.get("sort", "oldest")
+    if sort not in ("oldest", "newest"):
+        raise ValueError("sort must be 'oldest' or 'newest'")
+
+    return {
+        "fields": fields,
+        "category": args.get("category"),
+        "min_price": price_range[0],
+        "max_price": price_range[1],
+        "sort": sort,
+        "paginate": "limit" in args or "cursor" in args,
+        "limit": args.get("limit"),
+        "cursor": args.get("cursor"),
+    }
+
+
+def list_products(fields, category, min_price, max_price, sort, paginate, limit, cursor):
+    """
+    Load only the requested columns for the listing.
+    Without `limit`/`cursor` this returns the full list, as the storefront has always received;
+    otherwise an {"items", "next_cursor"} page ordered by id (ids follow created_at).
+    """
+    query = select_fields(Product, fields)
+    if category:
+        query = query.where(Product.category == category)
+    if min_price is not None:
+        query = query.where(Product.price >= min_price)
+    if max_price is not None:
+        query = query.where(Product.price <= max_price)
+
+    descending = sort == "newest"
+    if not paginate:
+        order = Product.id.desc() if descending else Product.id.asc()
+        rows = db.session.execute(query.order_by(order)).all()
+        return serialize_rows(fields, rows)
+
+    query, limit = keyset_page(query, Product.id, {"limit": limit, "cursor": cursor}, descending)
+    rows, next_cursor = split_page(db.session.execute(query).all(), limit, key=lambda row: row[0])
+    return {
+        "items": serialize_rows(fields, rows),
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,161 @@
+import os
+import statistics
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+bedjos = AppGroup("bedjos", help="Bedjos Solutions maintenance commands.")
+
+DEFAULT_ADMIN_EMAIL = "admin@bedjos.co.ke"
+DEFAULT_ADMIN_PASSWORD = "Admin@123"
+
+
+def create_admin(email, password):
+    from . import db
+    from .models import Admin
+
+    if Admin.query.filter_by(email=email).first():
+        click.echo(f"Admin {email} already exists")
+        return
+    admin = Admin(email=email)
+    admin.set_password(password)
+    db.session.add(admin)
+    db.session.commit()
+    click.echo(f"✅ Admin created: {email}")
+
+
+@bedjos.command("init-db")
+def init_db():
+    """Apply all migrations and create the default admin. Run once per deploy, before the workers start."""
+    from flask_migrate import upgrade
+
+    upgrade()
+    create_admin(
+        os.environ.get("ADMIN_EMAIL", DEFAULT_ADMIN_EMAIL),
+        os.environ.get("ADMIN_PASSWORD", DEFAULT_ADMIN_PASSWORD)
+    )
+
+
+@bedjos.command("seed-admin")
+@click.option("--email", envvar="ADMIN_EMAIL", default=DEFAULT_ADMIN_EMAIL, show_default=True)
+@click.option("--password", envvar="ADMIN_PASSWORD", default=DEFAULT_ADMIN_PASSWORD)
+def seed_admin(email, password):
+    """Create an admin account if it does not exist yet."""
+    create_admin(email, password)
+
+
+@bedjos.command("check-schema")
+def check_schema_command():
+    """Exit non-zero if the database is not at the latest migration."""
+    from .schema import SchemaOutOfDate, check_schema
+
+    try:
+        check_schema()
+    except SchemaOutOfDate as e:
+        raise click.ClickException(str(e))
+    click.echo("Database schema is up to date")
+
+
+@bedjos.command("startup-time")
+@click.option("--runs", default=20, show_default=True, help="Number of apps to create.")
+def startup_time(runs):
+    """Measure how long create_app() takes, the cost paid by every worker boot."""
+    from . import create_app
+
+    timings = []
+    for _ in range(runs):
+        app = create_app()
+        timings.append(app.config["STARTUP_SECONDS"] * 1000)
+    click.echo(
+        f"create_app over {runs} runs: median {statistics.median(timings):.1f} ms, "
+        f"min {min(timings):.1f} ms, max {max(timings):.1f} ms"
+    )
+
+
+@bedjos.command("send-outbox")
+@click.option("--loop", is_flag=True, help="Keep polling instead of exiting once the outbox is empty.")
+def send_outbox(loop):
+    """Deliver queued email notifications."""
+    from .mailer import POLL_INTERVAL_SECONDS, OutboxSender
+
+    sender = OutboxSender(current_app.config)
+    while True:
+        sent = sender.drain()
+        if sent:
+            click.echo(f"Handled {sent} queued email(s)")
+        if not loop:
+            break
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+@bedjos.command("recompute-stats")
+def recompute_stats_command():
+    """Rebuild the dashboard rollups from the orders and products tables."""
+    from .stats import recompute_stats
+
+    drifted = recompute_stats()
+    if drifted:
+        click.echo(f"Rebuilt rollups; corrected {len(drifted)} row(s): {', '.join(drifted)}")
+    else:
+        click.echo("Rebuilt rollups; stored counters were already correct")
+
+
+@bedjos.command("compact-carts")
+@click.option("--days", type=int, help="Delete carts idle this many days. Default: CART_EXPIRY_DAYS.")
+@click.option("--batch-size", type=int, help="Rows per transaction. Default: CART_COMPACTION_BATCH_SIZE.")
+def compact_carts_command(days, batch_size):
+    """Delete abandoned carts in short batches and report the space reclaimed."""
+    from datetime import timedelta
+
+    from .cart import compact_carts
+
+    config = current_app.config
+    result = compact_carts(
+        timedelta(days=config["CART_EXPIRY_DAYS"] if days is None else days),
+        batch_size or config["CART_COMPACTION_BATCH_SIZE"]
+    )
+    reclaimed = "unknown" if result["bytes"] is None else f"{result['bytes'] / 1024:.1f} KiB"
+    click.echo(f"Deleted {result['rows']} cart row(s) in {result['batches']} batch(es); {reclaimed} reclaimed")
+
+
+@bedjos.command("import-products")
+@click.argument("source", type=click.File("rb"))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Default: from the file extension, else CSV.")
+def import_products_command(source, fmt):
+    """Upsert products from a CSV or NDJSON file ('-' for stdin)."""
+    from . import db
+    from .analytics import invalidate_analytics
+    from .catalog import bump_catalog_version
+    from .product_io import detect_format, import_products
+
+    from sqlalchemy.exc import DataError, IntegrityError
+
+    started = time.perf_counter()
+    try:
+        summary = import_products(source, detect_format(fmt, source.name))
+        invalidate_analytics(group="category")
+        db.session.commit()
+    except (IntegrityError, DataError) as e:
+        db.session.rollback()
+        raise click.ClickException(f"Import failed, nothing was saved: {e.orig}")
+    bump_catalog_version()
+    click.echo(
+        f"{summary['processed']} row(s) in {time.perf_counter() - started:.1f}s: "
+        f"{summary['created']} created, {summary['updated']} updated, "
+        f"{summary['not_found']} not found, {summary['skipped']} skipped"
+    )
+    for error in summary["errors"]:
+        click.echo(f"  line {error['line']}: {error['error']}", err=True)
+
+
+@bedjos.command("export-products")
+@click.argument("destination", type=click.File("wb"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv", show_default=True)
+def export_products_command(destination, fmt):
+    """Write the catalog as CSV or NDJSON to a file (default stdout)."""
+    from .product_io import export_products
+
+    for chunk in export_products(fmt):
+        destination.write(chunk)
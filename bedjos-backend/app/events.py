@@ -0,0 +1,167 @@
+import os
+import queue
+import threading
+import time
+
+from .json_provider import dumps, loads
+
+# Topics: "orders" (admin only) and "payment:<checkout request id>"
+ORDERS_TOPIC = "orders"
+SUBSCRIBER_QUEUE_SIZE = 100
+REDIS_CHANNEL_PREFIX = "bedjos:events:"
+
+
+def payment_topic(reference):
+    return f"payment:{reference}"
+
+
+class Subscription:
+    def __init__(self, broker, topics):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next (event, data) tuple, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    In-process pub/sub. Each subscriber has a bounded queue; one that falls that far
+    behind is marked overflowed and its stream closes, and the client reconnects.
+    Only subscribers in the publishing process see an event, so use a shared broker
+    (EVENTS_BROKER_URL) with more than one worker process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, topics)
+        with self.lock:
+            for topic in subscription.topics:
+                self.subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                subscribers = self.subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[topic]
+
+    def deliver(self, topic, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((event, data))
+            except queue.Full:
+                subscription.overflowed = True
+
+    def publish(self, topic, event, data):
+        self.deliver(topic, event, data)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Fans events out across processes through Redis pub/sub. Publishing goes to Redis
+    only; one listener thread per process delivers everything it hears to local subscribers.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        super().__init__()
+        self.redis = redis.Redis.from_url(url)
+        self.listener = None
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(REDIS_CHANNEL_PREFIX + "*")
+                for message in pubsub.listen():
+                    payload = loads(message["data"])
+                    self.deliver(payload["topic"], payload["event"], payload["data"])
+            except Exception:
+                # Connection lost: subscribers keep their streams, events resume on reconnect
+                time.sleep(1)
+
+    def subscribe(self, topics):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+                self.listener.start()
+        return super().subscribe(topics)
+
+    def publish(self, topic, event, data):
+        self.redis.publish(
+            REDIS_CHANNEL_PREFIX + topic, dumps({"topic": topic, "event": event, "data": data})
+        )
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def _reset_broker():
+    global _broker
+    _broker = None
+
+
+# Subscribers and listener threads don't survive a fork
+os.register_at_fork(after_in_child=_reset_broker)
+
+
+def get_broker(config):
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = config["EVENTS_BROKER_URL"]
+            _broker = RedisBroker(url) if url else LocalBroker()
+        return _broker
+
+
+def publish_event(app, topic, event, data):
+    """Publish once the change is committed. A broker outage never fails the request."""
+    try:
+        get_broker(app.config).publish(topic, event, data)
+    except Exception:
+        app.logger.exception("Could not publish %s event", event)
+
+
+def format_event(event, data):
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def event_stream(subscription, initial=(), heartbeat=15, max_seconds=300, retry_ms=3000):
+    """
+    Server-sent events for one subscription. Comments keep idle proxies from closing
+    the connection; after `max_seconds` the stream ends and EventSource reconnects,
+    which spreads long-lived connections across workers.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f"retry: {retry_ms}\n\n".encode("ascii")
+        for event, data in initial:
+            yield format_event(event, data)
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            item = subscription.get(min(heartbeat, remaining))
+            yield format_event(*item) if item is not None else b": keep-alive\n\n"
+    finally:
+        subscription.close()
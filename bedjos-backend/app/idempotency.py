@@ -0,0 +1,99 @@
+import hashlib
+import random
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import IdempotencyKey
+
+# Fraction of new keys that also sweep a batch of expired ones
+PURGE_PROBABILITY = 0.01
+PURGE_BATCH = 500
+
+
+def _digest(value, length=64):
+    return hashlib.sha256(value).hexdigest()[:length]
+
+
+def purge_expired_keys(now=None):
+    expired = db.select(IdempotencyKey.key).where(
+        IdempotencyKey.expires_at < (now or datetime.utcnow())
+    ).limit(PURGE_BATCH)
+    db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired)))
+    db.session.commit()
+
+
+def idempotent(view):
+    """
+    Honour an Idempotency-Key header: the first request runs the view and stores
+    its response if it succeeded, and repeats within the TTL replay it instead of
+    writing again.
+    Requests without the header are unaffected.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get("Idempotency-Key")
+        if not client_key:
+            return view(*args, **kwargs)
+        if len(client_key) > 255:
+            return jsonify({"error": "Idempotency-Key too long"}), 400
+
+        key = _digest(f"{request.endpoint}:{client_key}".encode("utf-8"))
+        request_hash = _digest(request.get_data(), 32)
+        now = datetime.utcnow()
+
+        record = db.session.get(IdempotencyKey, key)
+        if record is not None and record.expires_at > now:
+            if record.request_hash != request_hash:
+                return jsonify({"error": "Idempotency-Key reused with a different request"}), 422
+            if record.status_code is None:
+                return jsonify({"error": "A request with this Idempotency-Key is in progress"}), 409
+            response = Response(record.response, status=record.status_code, mimetype="application/json")
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        # Reserve the key before running the view so concurrent retries can't both write.
+        # The reservation is a short lease, so a worker dying mid-request doesn't lock
+        # the key for the whole TTL; storing the response extends it.
+        if record is not None:
+            db.session.delete(record)
+        lease = timedelta(seconds=current_app.config["IDEMPOTENCY_LEASE_SECONDS"])
+        db.session.add(IdempotencyKey(key=key, request_hash=request_hash, expires_at=now + lease))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "A request with this Idempotency-Key is in progress"}), 409
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.key == key))
+            db.session.commit()
+            raise
+
+        if not 200 <= response.status_code < 300:
+            # Errors wrote nothing and may succeed later (after a restock, or with a
+            # corrected request), so release the key rather than replay them
+            db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.key == key))
+        else:
+            ttl = timedelta(hours=current_app.config["IDEMPOTENCY_TTL_HOURS"])
+            db.session.execute(
+                db.update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(
+                    status_code=response.status_code,
+                    response=response.get_data(),
+                    expires_at=datetime.utcnow() + ttl
+                )
+            )
+        db.session.commit()
+
+        if random.random() < PURGE_PROBABILITY:
+            purge_expired_keys(now)
+        return response
+    return wrapper
@@ -0,0 +1,60 @@
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _default(value):
+    # Datetimes use ISO 8601, the format the API has always returned (orjson does this natively)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        """Serialize to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        """Serialize to compact UTF-8 JSON bytes."""
+        return json.dumps(
+            obj, default=_default, separators=(",", ":"), ensure_ascii=False
+        ).encode("utf-8")
+
+    loads = json.loads
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    `jsonify` and `request.get_json` backed by orjson when it is installed.
+    Responses are built straight from the encoded bytes; keys keep their insertion order.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype="application/json")
@@ -0,0 +1,193 @@
+import os
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from flask import current_app
+
+from . import db
+from .models import EmailOutbox
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# How long a claimed batch stays locked before another worker may retry it
+CLAIM_LEASE = timedelta(minutes=5)
+POLL_INTERVAL_SECONDS = 30
+
+_worker = None
+
+
+def _reset_worker():
+    global _worker
+    _worker = None
+
+
+# Threads don't survive a fork; a forked process starts its own worker
+os.register_at_fork(after_in_child=_reset_worker)
+
+
+def queue_email(subject, body, recipient=None, reply_to=None):
+    """Add a message to the outbox in the caller's transaction; it is sent after commit."""
+    message = EmailOutbox(
+        recipient=recipient or current_app.config["MAIL_ADMIN_RECIPIENT"],
+        reply_to=reply_to,
+        subject=subject,
+        body=body
+    )
+    db.session.add(message)
+    return message
+
+
+def wake_outbox_worker():
+    if _worker is not None:
+        _worker.wake()
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def claim_batch(limit=BATCH_SIZE):
+    """Lock up to `limit` due messages for this worker; safe with several workers running."""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    due = db.select(EmailOutbox.id).where(
+        EmailOutbox.next_attempt_at <= now,
+        db.or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now)
+    ).order_by(EmailOutbox.id).limit(limit)
+    db.session.execute(
+        db.update(EmailOutbox)
+        .where(
+            EmailOutbox.id.in_(due),
+            db.or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now)
+        )
+        .values(claimed_by=token, locked_until=now + CLAIM_LEASE)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return EmailOutbox.query.filter_by(claimed_by=token).order_by(EmailOutbox.id).all()
+
+
+class OutboxSender:
+    """Delivers outbox messages over one SMTP connection, reopened only after errors."""
+
+    def __init__(self, config):
+        self.config = config
+        self.connection = None
+
+    def connect(self):
+        config = self.config
+        connection = smtplib.SMTP(config["MAIL_SERVER"], config["MAIL_PORT"], timeout=config["MAIL_TIMEOUT"])
+        if config["MAIL_USE_TLS"]:
+            connection.starttls()
+        if config["MAIL_USERNAME"]:
+            connection.login(config["MAIL_USERNAME"], config["MAIL_PASSWORD"])
+        return connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+    def send(self, outbox_message):
+        message = EmailMessage()
+        message["Subject"] = outbox_message.subject
+        message["From"] = self.config["MAIL_DEFAULT_SENDER"]
+        message["To"] = outbox_message.recipient
+        if outbox_message.reply_to:
+            message["Reply-To"] = outbox_message.reply_to
+        message.set_content(outbox_message.body)
+
+        if self.connection is None:
+            self.connection = self.connect()
+        try:
+            self.connection.send_message(message)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+            self.close()
+            raise
+
+    def drain_once(self):
+        """Send one claimed batch. Returns the number of messages handled."""
+        batch = claim_batch()
+        now = datetime.utcnow()
+        for index, message in enumerate(batch):
+            try:
+                self.send(message)
+            except (smtplib.SMTPException, OSError) as e:
+                message.attempts += 1
+                message.last_error = str(e)[:255]
+                message.claimed_by = None
+                message.locked_until = None
+                if message.attempts >= MAX_ATTEMPTS:
+                    message.next_attempt_at = None
+                    current_app.logger.error("Giving up on outbox message %s: %s", message.id, e)
+                else:
+                    message.next_attempt_at = now + backoff_delay(message.attempts)
+                if self.connection is None:
+                    # The server is unreachable; release the rest for a later pass
+                    for pending in batch[index + 1:]:
+                        pending.claimed_by = None
+                        pending.locked_until = None
+                        pending.next_attempt_at = message.next_attempt_at or now
+                    db.session.commit()
+                    return 0
+            else:
+                db.session.delete(message)
+        db.session.commit()
+        return len(batch)
+
+    def drain(self):
+        """Send until nothing is due, then close the connection."""
+        total = 0
+        try:
+            while True:
+                handled = self.drain_once()
+                total += handled
+                if handled < BATCH_SIZE:
+                    return total
+        finally:
+            self.close()
+
+
+class OutboxWorker(threading.Thread):
+    def __init__(self, app, poll_interval=POLL_INTERVAL_SECONDS):
+        super().__init__(name="email-outbox", daemon=True)
+        self.app = app
+        self.poll_interval = poll_interval
+        self.event = threading.Event()
+        self.stopping = False
+
+    def wake(self):
+        self.event.set()
+
+    def stop(self):
+        self.stopping = True
+        self.event.set()
+
+    def run(self):
+        sender = OutboxSender(self.app.config)
+        while not self.stopping:
+            with self.app.app_context():
+                try:
+                    sender.drain()
+                except Exception:
+                    self.app.logger.exception("Email outbox drain failed")
+                finally:
+                    db.session.remove()
+            self.event.wait(self.poll_interval)
+            self.event.clear()
+
+
+def start_outbox_worker(app):
+    global _worker
+    if _worker is None:
+        _worker = OutboxWorker(app)
+        _worker.start()
+    return _worker
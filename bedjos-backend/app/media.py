@@ -0,0 +1,272 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Uploaded product images are stored under the sha256 of their bytes, and each
+# resized variant is named after that hash and its width. A name therefore always
+# refers to the same bytes, so /api/media responses can be cached forever.
+#   <hash>.<ext>            the original, as uploaded
+#   <hash>-<width>.webp     variants, listed in the product's srcset
+#   <hash>-<width>.jpg      fallbacks for browsers without WebP
+# Resizing needs Pillow (in requirements.txt). An install without it still stores
+# and serves uploads, just without variants.
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MEDIA_NAME = re.compile(r"^(?P<hash>[0-9a-f]{64})(?:-(?P<width>[1-9][0-9]{0,4}))?\.(?P<ext>jpg|png|gif|webp)$")
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "progressive": True, "optimize": True}),
+}
+
+# Leading bytes of the formats browsers can show; anything else is rejected
+SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ImageRejected(ValueError):
+    """The upload is not an image we accept; the message is safe to show the client."""
+
+
+def sniff_format(head):
+    for signature, ext in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def media_url(name):
+    return f"/api/media/{name}"
+
+
+def variant_widths(original_width, widths):
+    """Configured widths narrower than the original, plus the original capped at the widest."""
+    chosen = [w for w in sorted(widths) if w < original_width]
+    chosen.append(min(original_width, max(widths)))
+    return sorted(set(chosen))
+
+
+def build_srcset(image_hash, original_width, widths):
+    return ", ".join(
+        f"{media_url(f'{image_hash}-{w}.webp')} {w}w" for w in variant_widths(original_width, widths)
+    )
+
+
+def fallback_name(image_hash, original_width, widths, preferred):
+    """The JPEG variant served as `image`: the widest one no wider than `preferred`."""
+    available = variant_widths(original_width, widths)
+    width = max([w for w in available if w <= preferred] or [available[0]])
+    return f"{image_hash}-{width}.jpg"
+
+
+def store_original(stream, media_root, max_bytes):
+    """
+    Copy an upload into `media_root` under its content hash, streaming through a
+    temporary file. Returns (hash, filename). Raises ImageRejected.
+    """
+    os.makedirs(media_root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=media_root, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            head = stream.read(CHUNK_SIZE)
+            ext = sniff_format(head)
+            if ext is None:
+                raise ImageRejected("Images must be JPEG, PNG, GIF or WebP")
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageRejected(f"Images must be at most {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                tmp.write(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+        image_hash = digest.hexdigest()
+        name = f"{image_hash}.{ext}"
+        path = os.path.join(media_root, name)
+        if os.path.exists(path):
+            os.unlink(tmp_path)  # same bytes uploaded before
+        else:
+            os.chmod(tmp_path, 0o644)  # mkstemp creates files private to the owner
+            os.replace(tmp_path, path)
+        return image_hash, name
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _oriented_width(image):
+    # EXIF orientation 5-8 means the stored image is rotated a quarter turn
+    orientation = image.getexif().get(0x0112, 1)
+    return image.height if orientation in (5, 6, 7, 8) else image.width
+
+
+def image_width(path):
+    """Width of the stored original, reading only its header. Raises ImageRejected."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            if width * height > Image.MAX_IMAGE_PIXELS:
+                raise ImageRejected("Image dimensions are too large")
+            return _oriented_width(image)
+    except (OSError, Image.DecompressionBombError):
+        raise ImageRejected("Image could not be read")
+
+
+def _write_atomic(image, path, pil_format, options):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".variant-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            image.save(tmp, pil_format, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def generate_variants(media_root, original_name, widths):
+    """
+    Write every missing variant of one original. Safe to run more than once or
+    concurrently: each file is written to a temporary name and renamed into place.
+    Returns the names written.
+    """
+    from PIL import Image, ImageOps
+
+    match = MEDIA_NAME.match(original_name)
+    image_hash = match["hash"]
+    written = []
+    with Image.open(os.path.join(media_root, original_name)) as source:
+        # Work out what is missing from the header alone; decoding is the expensive part
+        jobs = []
+        for width in sorted(variant_widths(_oriented_width(source), widths), reverse=True):
+            pending = [
+                (ext, pil_format, options)
+                for ext, (pil_format, options) in VARIANT_FORMATS.items()
+                if not os.path.exists(os.path.join(media_root, f"{image_hash}-{width}.{ext}"))
+            ]
+            if pending:
+                jobs.append((width, pending))
+        if not jobs:
+            return written
+        source = ImageOps.exif_transpose(source)
+        for width, pending in jobs:
+            height = max(1, round(source.height * width / source.width))
+            resized = source.convert("RGBA").resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+            for ext, pil_format, options in pending:
+                if pil_format == "JPEG":
+                    # JPEG has no alpha; flatten onto white rather than black
+                    flat = Image.new("RGB", resized.size, (255, 255, 255))
+                    flat.paste(resized, mask=resized.getchannel("A"))
+                    image = flat
+                else:
+                    image = resized
+                name = f"{image_hash}-{width}.{ext}"
+                _write_atomic(image, os.path.join(media_root, name), pil_format, options)
+                written.append(name)
+    return written
+
+
+# Resizing is CPU-bound, so it runs in a small process pool after the upload
+# request has returned. Variants are also built on demand by the media route,
+# so a job lost to a restart only costs one slow first request.
+_lock = threading.Lock()
+_pool = None
+
+
+def _reset_pool():
+    global _pool
+    _pool = None
+
+
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _get_pool(workers):
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(workers)
+        return _pool
+
+
+def _log_failure(original_name):
+    def callback(future):
+        if future.exception() is not None:
+            logger.error("Building variants of %s failed: %s", original_name, future.exception())
+    return callback
+
+
+def schedule_variants(config, original_name):
+    """Build an original's variants in the background (inline with IMAGE_WORKERS = 0)."""
+    args = (config["MEDIA_ROOT"], original_name, tuple(config["IMAGE_WIDTHS"]))
+    if not config["IMAGE_WORKERS"]:
+        return generate_variants(*args)
+    future = _get_pool(config["IMAGE_WORKERS"]).submit(generate_variants, *args)
+    future.add_done_callback(_log_failure(original_name))
+    return future
+
+
+def ensure_variant(config, name):
+    """
+    Make sure a requested media file exists, building a missing variant from its
+    original. Returns False when there is nothing to serve.
+    """
+    media_root = config["MEDIA_ROOT"]
+    match = MEDIA_NAME.match(name)
+    if match is None:
+        return False
+    if os.path.exists(os.path.join(media_root, name)):
+        return True
+    widths = tuple(config["IMAGE_WIDTHS"])
+    if (
+        match["width"] is None or match["ext"] not in VARIANT_FORMATS
+        or int(match["width"]) > max(widths) or not pillow_available()
+    ):
+        return False
+    originals = [
+        f"{match['hash']}.{ext}" for ext in ("jpg", "png", "gif", "webp")
+        if os.path.exists(os.path.join(media_root, f"{match['hash']}.{ext}"))
+    ]
+    if not originals:
+        return False
+    # Only widths the original has variants at; checked from its header, before any decoding
+    try:
+        original_width = image_width(os.path.join(media_root, originals[0]))
+    except ImageRejected:
+        return False
+    if int(match["width"]) not in variant_widths(original_width, widths):
+        return False
+    generate_variants(media_root, originals[0], widths)
+    return os.path.exists(os.path.join(media_root, name))
+
+
+def shutdown_pool():
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _reset_pool()
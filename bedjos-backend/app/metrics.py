@@ -0,0 +1,196 @@
+import contextvars
+import os
+import threading
+import time
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+# Per-endpoint request metrics, kept in memory by each worker process and rendered
+# in the Prometheus text format by /api/admin/metrics. Like the cache stats, the
+# numbers cover only the process that answers the scrape.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# The SQL tally of the request being handled on this thread, or None outside requests
+_current = contextvars.ContextVar("request_sql_stats", default=None)
+
+
+class SQLStats:
+    __slots__ = ("queries", "seconds", "started")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.started = None
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series = {}  # labels -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class Metrics:
+    LABELS = ("endpoint", "method")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.latency = Histogram(
+            "bedjos_http_request_duration_seconds",
+            "Time from the start of a request until its response headers are ready.",
+            LATENCY_BUCKETS
+        )
+        self.size = Histogram(
+            "bedjos_http_response_size_bytes",
+            "Response body size, for responses with a known length.",
+            SIZE_BUCKETS
+        )
+        self.queries = Histogram(
+            "bedjos_db_queries_per_request", "SQL statements executed per request.", QUERY_COUNT_BUCKETS
+        )
+        self.sql_time = Histogram(
+            "bedjos_db_seconds_per_request", "Time spent executing SQL per request.", LATENCY_BUCKETS
+        )
+
+    def record(self, endpoint, method, status, seconds, size, sql):
+        labels = (endpoint, method)
+        with self.lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.observe(labels, seconds)
+            if size is not None:
+                self.size.observe(labels, size)
+            self.queries.observe(labels, sql.queries)
+            self.sql_time.observe(labels, sql.seconds)
+
+    def render(self, cache_stats=None):
+        with self.lock:
+            lines = [
+                "# HELP bedjos_http_requests_total Requests handled, by endpoint, method and status.",
+                "# TYPE bedjos_http_requests_total counter",
+            ]
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f"bedjos_http_requests_total{{{_labels(self.LABELS + ('status',), labels)}}} {count}")
+            for histogram in (self.latency, self.size, self.queries, self.sql_time):
+                lines.extend(histogram.render(self.LABELS))
+        if cache_stats:
+            lines.extend(render_cache_stats(cache_stats))
+        return "\n".join(lines) + "\n"
+
+
+def render_cache_stats(stats):
+    """Cache counters as gauges, one series per tier (the near cache reports two)."""
+    tiers = [("local", stats["local"]), ("remote", stats["remote"])] if "local" in stats else [("main", stats)]
+    lines = []
+    for counter in ("hits", "misses", "evictions", "expirations", "entries"):
+        name = f"bedjos_cache_{counter}"
+        samples = [
+            f'{name}{{tier="{tier}",backend="{_escape(tier_stats["backend"])}"}} {tier_stats[counter]}'
+            for tier, tier_stats in tiers
+            if tier_stats.get(counter) is not None
+        ]
+        if samples:
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+    return lines
+
+
+_metrics = Metrics()
+
+
+def _reset_metrics():
+    global _metrics
+    _metrics = Metrics()
+
+
+# Each worker reports its own requests, not the ones its parent saw
+os.register_at_fork(after_in_child=_reset_metrics)
+
+
+def get_metrics():
+    return _metrics
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None and stats.started is not None:
+        stats.queries += 1
+        stats.seconds += time.perf_counter() - stats.started
+        stats.started = None
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    _current.set(SQLStats())
+
+
+def _finish_request(response):
+    started = g.pop("metrics_started", None)
+    sql = _current.get()
+    if started is None or sql is None:
+        return response
+    _current.set(None)
+    seconds = time.perf_counter() - started
+
+    # A streamed body (exports, SSE) is produced later: only the time to its headers
+    # is measured, and neither its size nor the SQL it runs is counted
+    size = None if response.is_streamed else response.content_length
+    _metrics.record(request.endpoint or "unmatched", request.method, response.status_code, seconds, size, sql)
+    if current_app.config["METRICS_SERVER_TIMING"]:
+        response.headers["Server-Timing"] = (
+            f'app;dur={seconds * 1000:.1f}, db;dur={sql.seconds * 1000:.1f};desc="{sql.queries} queries"'
+        )
+    return response
+
+
+def init_metrics(app):
+    """Time every request and the SQL it runs. Call inside an app context (needs the engine)."""
+    from . import db
+
+    event.listen(db.engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(db.engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
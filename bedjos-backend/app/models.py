@@ -1,13 +1,18 @@
+from datetime import datetime
 from . import db
 from passlib.hash import pbkdf2_sha256 as hash
+from .passwords import hash_password
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     price = db.Column(db.Float, nullable=False)
     image = db.Column(db.String(255))
-    category = db.Column(db.String(100))
+    category = db.Column(db.String(100), index=True)
     description = db.Column(db.Text)
+    stock = db.Column(db.Integer)  # None means made to order, not stock-tracked
+    image_hash = db.Column(db.String(64))  # sha256 of an uploaded image, see app/media.py
+    srcset = db.Column(db.Text)  # WebP variants of the uploaded image, ready for <img srcset>
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
 class Order(db.Model):
@@ -16,8 +21,17 @@ class Order(db.Model):
     phone = db.Column(db.String(20), nullable=False)
     email = db.Column(db.String(120))
     total = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(50), default="pending")  # pending, completed, cancelled
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    status = db.Column(db.String(50), default="pending", index=True)  # pending, completed, cancelled
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), index=True)
+
+    items = db.relationship('OrderItem', backref='order', lazy=True)
+
+class OrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)  # unit price when the order was placed
 
 class Admin(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,7 +39,8 @@ class Admin(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     
     def set_password(self, password):
-        self.password_hash = hash.hash(password)
+        # Hashed inline at the configured rounds; request handlers go through app.passwords
+        self.password_hash = hash_password(password, offload=False)
     
     def check_password(self, password):
         return hash.verify(password, self.password_hash)
@@ -36,9 +51,17 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, default=1)
     session_id = db.Column(db.String(120), nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Set on every row of a cart whenever the cart changes; carts idle past
+    # CART_EXPIRY_DAYS are deleted by app.cart.compact_carts
+    last_touched = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     product = db.relationship('Product', backref='cart_items')
 
+    __table_args__ = (
+        # One row per product per cart; also serves the session_id lookups
+        db.Index('uq_cart_item_session_product', 'session_id', 'product_id', unique=True),
+    )
+
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -48,7 +71,8 @@ class Customer(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
     def set_password(self, password):
-        self.password_hash = hash.hash(password)
+        # Hashed inline at the configured rounds; request handlers go through app.passwords
+        self.password_hash = hash_password(password, offload=False)
 
     def check_password(self, password):
         return hash.verify(password, self.password_hash)
@@ -59,4 +83,53 @@ class ContactMessage(db.Model):
     email = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
     message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), index=True)
+
+class IdempotencyKey(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of endpoint + client key
+    request_hash = db.Column(db.String(32), nullable=False)
+    status_code = db.Column(db.Integer)  # None while the first request is still running
+    response = db.Column(db.LargeBinary)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Payment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    checkout_request_id = db.Column(db.String(64), unique=True, nullable=False)
+    merchant_request_id = db.Column(db.String(64))
+    phone = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)  # whole KES, as Daraja charges
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, completed, cancelled, failed
+    result_code = db.Column(db.Integer)
+    result_desc = db.Column(db.String(255))
+    receipt_number = db.Column(db.String(32))
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime)
+
+    order = db.relationship('Order', backref='payments')
+
+class RevokedToken(db.Model):
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.DateTime, index=True)  # once past, the token is dead anyway
+
+class EmailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    reply_to = db.Column(db.String(120))
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # None once delivery has been given up on; sent messages are deleted
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    claimed_by = db.Column(db.String(32))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+class DailyStats(db.Model):
+    # One row per day plus an all-time row (day == "all"), kept current by order and product writes
+    day = db.Column(db.String(10), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    product_count = db.Column(db.Integer, nullable=False, default=0)  # all-time row only
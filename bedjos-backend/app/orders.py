@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from . import db
+from .models import Order, OrderItem, Product
+from .stats import record_new_order
+
+
+class OrderError(Exception):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details
+
+
+def parse_order_items(items):
+    """Validate line items and merge repeated products. Returns {product_id: quantity}."""
+    if not isinstance(items, list) or not items:
+        raise OrderError("Order items required")
+    quantities = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise OrderError("Invalid order item")
+        product_id = item.get("product_id")
+        quantity = item.get("quantity", 1)
+        if not isinstance(product_id, int):
+            raise OrderError("Each item needs a product_id")
+        if not isinstance(quantity, int) or quantity < 1:
+            raise OrderError("Quantity must be a positive integer")
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def place_order(customer_name, phone, email, quantities):
+    """
+    Create an order and its line items in one transaction.
+    Prices come from the database, never the client. Stock is reserved with a
+    conditional UPDATE per tracked product, so concurrent checkouts can't oversell;
+    any failure rolls back the whole order. The stats rollup is updated in the same commit.
+    """
+    rows = db.session.execute(
+        db.select(Product.id, Product.name, Product.price, Product.stock)
+        .where(Product.id.in_(quantities))
+    ).all()
+    products = {row.id: row for row in rows}
+    missing = sorted(set(quantities) - set(products))
+    if missing:
+        raise OrderError("Product not found", 404, product_ids=missing)
+
+    stock_changed = False
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        if product.stock is None:
+            continue
+        result = db.session.execute(
+            db.update(Product)
+            .where(Product.id == product_id, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            raise OrderError(f"Insufficient stock for {product.name}", 409, product_id=product_id)
+        stock_changed = True
+
+    order = Order(
+        customer_name=customer_name,
+        phone=phone,
+        email=email,
+        total=sum(products[pid].price * qty for pid, qty in quantities.items()),
+        status="pending",
+        # Set here rather than by the server default so the stats rollup knows the day
+        created_at=datetime.utcnow()
+    )
+    order.items = [
+        OrderItem(product_id=pid, quantity=qty, price=products[pid].price)
+        for pid, qty in quantities.items()
+    ]
+    db.session.add(order)
+    record_new_order(order)
+    db.session.commit()
+    return order, stock_changed
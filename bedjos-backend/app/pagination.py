@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import Response, request, stream_with_context
+
+from . import db
+from .json_provider import dumps
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+STREAM_BATCH_SIZE = 1000
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+
+def keyset_page(query, key_column, args, descending=False):
+    """
+    Apply keyset pagination on a unique, indexed column (normally the primary key).
+    Returns (query, limit); fetch limit + 1 rows and hand them to `split_page`.
+    """
+    limit = parse_limit(args.get("limit"))
+    cursor = args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        # Keys are integer ids; anything else would be compared as text, or fail in SQL
+        if (not isinstance(values, list) or len(values) != 1
+                or not isinstance(values[0], int) or isinstance(values[0], bool)):
+            raise ValueError("Invalid cursor")
+        last = values[0]
+        query = query.where(key_column < last if descending else key_column > last)
+    order = key_column.desc() if descending else key_column.asc()
+    return query.order_by(order).limit(limit + 1), limit
+
+
+def split_page(rows, limit, key):
+    """Trim the look-ahead row and build the cursor for the next page."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([key(rows[-1])])
+
+
+def parse_date_range(args):
+    """
+    Read `from`/`to` (ISO dates or datetimes). A date-only `to` includes that whole day.
+    Returns (start, end) where end is exclusive; either may be None.
+    """
+    bounds = []
+    for name in ("from", "to"):
+        value = args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"'{name}' must be an ISO date")
+        if name == "to" and len(value) == 10:
+            parsed += timedelta(days=1)
+        bounds.append(parsed)
+    return bounds[0], bounds[1]
+
+
+def created_between(query, column, start, end):
+    # SQLite keeps server-default timestamps as 'YYYY-MM-DD HH:MM:SS' text, while bound
+    # datetimes carry microseconds. Shifting each bound by 1µs keeps the text comparison exact.
+    if start is not None:
+        query = query.where(column > start - timedelta(microseconds=1))
+    if end is not None:
+        query = query.where(column <= end - timedelta(microseconds=1))
+    return query
+
+
+def wants_ndjson():
+    return (request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == "application/x-ndjson")
+
+
+def ndjson_response(query, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Stream a column query as newline-delimited JSON, holding at most one batch of rows in memory."""
+    def generate():
+        result = db.session.execute(query.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield b"".join(dumps(serialize(row)) + b"\n" for row in partition)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
@@ -0,0 +1,105 @@
+import concurrent.futures
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from passlib.context import CryptContext
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full or too slow; the request should be retried later."""
+
+
+@functools.lru_cache(maxsize=None)
+def _context(rounds):
+    # Pinning min/max to the configured rounds makes verify_and_update() return a fresh
+    # hash whenever PASSWORD_HASH_ROUNDS changes, so stored hashes follow the setting.
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds,
+        pbkdf2_sha256__max_rounds=rounds
+    )
+
+
+def _hash(password, rounds):
+    return _context(rounds).hash(password)
+
+
+def _verify(password, password_hash, rounds):
+    return _context(rounds).verify_and_update(password, password_hash)
+
+
+# PBKDF2 is CPU-bound, so it runs in a small process pool instead of the request thread.
+# A semaphore caps the work in flight; past that, callers get HashingBusy (a 429).
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+# A forked web worker must not share its parent's pool (or its semaphore)
+def _reset_pool():
+    global _pool, _slots
+    _pool = None
+    _slots = None
+
+
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _get_pool(config):
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            workers = config["PASSWORD_HASH_WORKERS"]
+            _pool = ProcessPoolExecutor(workers)
+            _slots = threading.BoundedSemaphore(workers + config["PASSWORD_HASH_QUEUE"])
+        return _pool, _slots
+
+
+def _run(fn, *args):
+    config = current_app.config
+    if not config["PASSWORD_HASH_WORKERS"]:
+        return fn(*args)
+
+    pool, slots = _get_pool(config)
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=config["PASSWORD_HASH_TIMEOUT"])
+    except concurrent.futures.TimeoutError:
+        # The pool is too far behind; the job still finishes and frees its slot
+        raise HashingBusy()
+
+
+def hash_password(password, offload=True):
+    rounds = current_app.config["PASSWORD_HASH_ROUNDS"]
+    if not offload:
+        return _hash(password, rounds)
+    return _run(_hash, password, rounds)
+
+
+def verify_password(user, password):
+    """
+    Check a password for an Admin or Customer, rehashing it in the session when the
+    stored hash uses different rounds; the caller commits. Raises HashingBusy when saturated.
+    """
+    valid, new_hash = _run(_verify, password, user.password_hash, current_app.config["PASSWORD_HASH_ROUNDS"])
+    if valid and new_hash:
+        user.password_hash = new_hash
+    return valid
+
+
+def shutdown_pool():
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _reset_pool()
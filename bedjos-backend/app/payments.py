@@ -0,0 +1,225 @@
+import base64
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import db
+from .models import Payment
+
+# Daraja timestamps are Kenyan local time, which has no DST
+EAT = timezone(timedelta(hours=3))
+# Refresh the OAuth token this long before Daraja says it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+REQUIRED_SETTINGS = (
+    "MPESA_CONSUMER_KEY", "MPESA_CONSUMER_SECRET", "MPESA_SHORTCODE", "MPESA_PASSKEY", "MPESA_CALLBACK_URL",
+    "MPESA_CALLBACK_TOKEN"
+)
+# ResultCode for a push the customer dismissed; any other non-zero code is a failure
+RESULT_CANCELLED = 1032
+
+
+class DarajaError(Exception):
+    """Daraja rejected a request or could not be reached."""
+
+
+def mpesa_configured(config):
+    return all(config.get(name) for name in REQUIRED_SETTINGS)
+
+
+def callback_url(config):
+    """MPESA_CALLBACK_URL with ?token=MPESA_CALLBACK_TOKEN, which the callback route requires."""
+    parts = urlsplit(config["MPESA_CALLBACK_URL"])
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "token"]
+    query.append(("token", config["MPESA_CALLBACK_TOKEN"]))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def normalize_phone(phone):
+    """0712345678, +254712345678 and 254712345678 all become 254712345678."""
+    digits = re.sub(r"[\s-]", "", str(phone)).lstrip("+")
+    if digits.startswith("0"):
+        digits = "254" + digits[1:]
+    if not re.fullmatch(r"254[17]\d{8}", digits):
+        raise ValueError("Enter a valid Safaricom phone number")
+    return digits
+
+
+class DarajaClient:
+    """
+    Talks to Daraja over one pooled session. The OAuth token is cached until shortly
+    before it expires, so an STK push costs a single upstream call.
+    """
+
+    def __init__(self, config):
+        self.base_url = config["MPESA_BASE_URL"].rstrip("/")
+        self.config = config
+        self.timeout = (config["MPESA_CONNECT_TIMEOUT"], config["MPESA_READ_TIMEOUT"])
+        self.session = requests.Session()
+        # Only connection failures are retried; a retried STK push could charge twice
+        adapter = HTTPAdapter(
+            pool_maxsize=config["MPESA_POOL_SIZE"],
+            max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.token = None
+        self.token_expires = 0
+
+    def _request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise DarajaError(f"M-Pesa is unreachable: {e}") from e
+        return response
+
+    def access_token(self, refresh=False):
+        with self.lock:
+            if refresh or self.token is None or time.monotonic() >= self.token_expires:
+                response = self._request(
+                    "GET", "/oauth/v1/generate", params={"grant_type": "client_credentials"},
+                    auth=(self.config["MPESA_CONSUMER_KEY"], self.config["MPESA_CONSUMER_SECRET"])
+                )
+                if response.status_code != 200:
+                    raise DarajaError(f"M-Pesa authentication failed ({response.status_code})")
+                data = response.json()
+                self.token = data["access_token"]
+                self.token_expires = (
+                    time.monotonic() + int(data.get("expires_in", 3599)) - TOKEN_REFRESH_MARGIN_SECONDS
+                )
+            return self.token
+
+    def stk_push(self, phone, amount, reference, description):
+        timestamp = datetime.now(EAT).strftime("%Y%m%d%H%M%S")
+        shortcode = self.config["MPESA_SHORTCODE"]
+        password = base64.b64encode(f"{shortcode}{self.config['MPESA_PASSKEY']}{timestamp}".encode()).decode()
+        payload = {
+            "BusinessShortCode": shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": self.config["MPESA_TRANSACTION_TYPE"],
+            "Amount": amount,
+            "PartyA": phone,
+            "PartyB": shortcode,
+            "PhoneNumber": phone,
+            "CallBackURL": callback_url(self.config),
+            "AccountReference": reference,
+            "TransactionDesc": description,
+        }
+        for attempt in range(2):
+            response = self._request(
+                "POST", "/mpesa/stkpush/v1/processrequest", json=payload,
+                headers={"Authorization": f"Bearer {self.access_token(refresh=attempt > 0)}"}
+            )
+            # A token revoked upstream before its expiry: fetch a new one and try once more
+            if response.status_code != 401:
+                break
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code != 200 or str(data.get("ResponseCode")) != "0":
+            message = data.get("errorMessage") or data.get("ResponseDescription") or response.status_code
+            raise DarajaError(f"M-Pesa rejected the payment request: {message}")
+        return data
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _reset_client():
+    global _client
+    _client = None
+
+
+# Pooled connections must not be shared with a forked worker
+os.register_at_fork(after_in_child=_reset_client)
+
+
+def get_client(config):
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DarajaClient(config)
+        return _client
+
+
+def start_stk_push(config, order, phone):
+    """Send an STK push for the order's total and record it as a pending payment."""
+    amount = math.ceil(order.total)
+    data = get_client(config).stk_push(phone, amount, f"ORDER{order.id}", f"Bedjos order {order.id}")
+    payment = Payment(
+        order_id=order.id,
+        checkout_request_id=data["CheckoutRequestID"],
+        merchant_request_id=data.get("MerchantRequestID"),
+        phone=phone,
+        amount=amount,
+        status="pending"
+    )
+    db.session.add(payment)
+    db.session.commit()
+    return payment, data.get("CustomerMessage")
+
+
+def handle_callback(payload):
+    """
+    Apply a Daraja STK callback to its payment. Returns the payment, or None when the
+    callback is for a push we don't know. Repeated callbacks leave a settled payment alone.
+    """
+    try:
+        callback = payload["Body"]["stkCallback"]
+        checkout_request_id = callback["CheckoutRequestID"]
+        result_code = int(callback["ResultCode"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Malformed M-Pesa callback")
+
+    payment = Payment.query.filter_by(checkout_request_id=checkout_request_id).first()
+    if payment is None or payment.status != "pending":
+        return payment
+
+    metadata = {
+        item.get("Name"): item.get("Value")
+        for item in (callback.get("CallbackMetadata") or {}).get("Item", [])
+    }
+    payment.result_code = result_code
+    payment.result_desc = str(callback.get("ResultDesc", ""))[:255]
+    payment.updated_at = datetime.utcnow()
+    if result_code == 0:
+        try:
+            paid = float(metadata.get("Amount"))
+        except (TypeError, ValueError):
+            paid = 0
+        if paid < payment.amount:
+            # Never settle an order on a callback that doesn't cover it
+            payment.status = "failed"
+            payment.result_desc = f"Amount paid ({metadata.get('Amount')}) is less than {payment.amount}"[:255]
+        else:
+            payment.status = "completed"
+        payment.receipt_number = metadata.get("MpesaReceiptNumber")
+    elif result_code == RESULT_CANCELLED:
+        payment.status = "cancelled"
+    else:
+        payment.status = "failed"
+    db.session.commit()
+    return payment
+
+
+def serialize_payment(payment):
+    return {
+        "status": payment.status,
+        "reference": payment.checkout_request_id,
+        "order_id": payment.order_id,
+        "amount": payment.amount,
+        "receipt_number": payment.receipt_number,
+        "result_desc": payment.result_desc,
+        "verified_at": payment.updated_at,
+    }
@@ -0,0 +1,217 @@
+import csv
+import io
+import math
+
+from . import db
+from .json_provider import dumps, loads
+from .models import Product
+from .serializers import PRODUCT_FIELDS, select_fields, serialize_product
+from .sql import upsert_insert
+from .stats import record_stats
+
+FORMATS = ("csv", "ndjson")
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+TEXT_FIELDS = ("image", "category", "description")
+
+
+def detect_format(requested=None, filename=None, mimetype=None):
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return requested
+    if (filename or "").lower().endswith((".ndjson", ".jsonl")) or mimetype == "application/x-ndjson":
+        return "ndjson"
+    return "csv"
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, raw dict or parse error message) from a binary stream, one line at a time."""
+    if fmt == "csv":
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        yield number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def parse_stock(value):
+    """A stock level from client input: a non-negative integer, or None (untracked). Raises ValueError."""
+    if _blank(value):
+        return None
+    try:
+        stock = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("stock must be an integer")
+    if stock < 0:
+        raise ValueError("stock must not be negative")
+    return stock
+
+
+def _check_length(field, value):
+    # PostgreSQL rejects over-long strings (and fails the whole import); SQLite would store them
+    limit = getattr(Product.__table__.c[field].type, "length", None)
+    if limit is not None and len(value) > limit:
+        raise ValueError(f"{field} must be at most {limit} characters")
+    return value
+
+
+def validate_row(raw):
+    """
+    Turn one raw CSV/NDJSON record into column values. Only columns present in the
+    record are returned, so an upsert leaves the others alone. Raises ValueError.
+    """
+    unknown = set(raw) - set(PRODUCT_FIELDS)
+    unknown.discard(None)  # csv puts surplus cells under None
+    # srcset comes from image uploads; it is accepted so exports re-import, but not written
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    row = {}
+    if not _blank(raw.get("id")):
+        try:
+            row["id"] = int(raw["id"])
+        except (TypeError, ValueError):
+            raise ValueError("id must be an integer")
+        if row["id"] < 1:
+            raise ValueError("id must be positive")
+
+    name = raw.get("name")
+    if "id" not in row or "name" in raw:
+        if _blank(name) or not isinstance(name, str):
+            raise ValueError("name is required")
+        row["name"] = _check_length("name", name.strip())
+
+    if "id" not in row or "price" in raw:
+        try:
+            price = float(raw.get("price"))
+        except (TypeError, ValueError):
+            raise ValueError("price must be a number")
+        if not math.isfinite(price) or price < 0:
+            raise ValueError("price must not be negative")
+        row["price"] = price
+
+    if "stock" in raw:
+        row["stock"] = parse_stock(raw["stock"])
+
+    for field in TEXT_FIELDS:
+        if field in raw:
+            value = raw[field]
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{field} must be a string")
+            row[field] = None if _blank(value) else _check_length(field, value.strip())
+    return row
+
+
+def _write_batch(columns, rows):
+    """Write one batch. Returns how many rows named an id that doesn't exist (partial updates only)."""
+    if "id" not in columns:
+        db.session.execute(db.insert(Product), rows)
+        return 0
+    if "name" in columns and "price" in columns:
+        stmt = upsert_insert(Product.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={c: getattr(stmt.excluded, c) for c in columns if c != "id"}
+        )
+        db.session.execute(stmt, rows)
+        return 0
+    # NOT NULL is checked before ON CONFLICT, so rows without name and price can
+    # only update existing products
+    stmt = (
+        db.update(Product.__table__)
+        .where(Product.__table__.c.id == db.bindparam("match_id"))
+        .values({c: db.bindparam(c) for c in columns if c != "id"})
+    )
+    result = db.session.execute(stmt, [{**row, "match_id": row["id"]} for row in rows])
+    return len(rows) - result.rowcount
+
+
+def import_products(stream, fmt):
+    """
+    Upsert products from a CSV or NDJSON stream in one transaction: rows with an id
+    update or create that product (an id with only some columns updates just those),
+    rows without one are inserted. Rows are written in
+    executemany batches grouped by their set of columns; invalid rows are skipped and
+    reported. Does not commit.
+    """
+    before = db.session.scalar(db.select(db.func.count(Product.id)))
+    batches = {}
+    processed = skipped = not_found = 0
+    errors = []
+
+    for line, raw in read_rows(stream, fmt):
+        try:
+            if isinstance(raw, str):
+                raise ValueError(raw)
+            row = validate_row(raw)
+        except ValueError as e:
+            skipped += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "error": str(e)})
+            continue
+
+        columns = tuple(sorted(row))
+        batch = batches.setdefault(columns, [])
+        batch.append(row)
+        processed += 1
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            not_found += _write_batch(columns, batch)
+            batches[columns] = []
+
+    for columns, batch in batches.items():
+        if batch:
+            not_found += _write_batch(columns, batch)
+
+    if db.engine.dialect.name == "postgresql":
+        # Explicit ids bypass the sequence; move it past them
+        db.session.execute(db.text(
+            "SELECT setval(pg_get_serial_sequence('product', 'id'), COALESCE(MAX(id), 1)) FROM product"
+        ))
+
+    created = db.session.scalar(db.select(db.func.count(Product.id))) - before
+    if created:
+        record_stats(product_count=created)
+    return {
+        "processed": processed,
+        "created": created,
+        "updated": processed - created - not_found,
+        "not_found": not_found,
+        "skipped": skipped,
+        "errors": errors,
+    }
+
+
+def export_products(fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the catalog as CSV or NDJSON chunks, holding one batch of rows at a time."""
+    result = db.session.execute(
+        select_fields(Product).order_by(Product.id).execution_options(yield_per=batch_size)
+    )
+    if fmt == "ndjson":
+        for partition in result.partitions():
+            yield b"".join(dumps(serialize_product(row)) + b"\n" for row in partition)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_FIELDS)
+    for partition in result.partitions():
+        writer.writerows(partition)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
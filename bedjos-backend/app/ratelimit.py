@@ -0,0 +1,78 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# Buckets live in process memory, so each worker enforces its own limit
+MAX_TRACKED_KEYS = 10000
+
+
+class TokenBucketLimiter:
+    """
+    One token bucket per key: `burst` tokens, refilled at `per_minute` tokens a minute.
+    Idle keys are dropped oldest-first once MAX_TRACKED_KEYS are tracked.
+    """
+
+    def __init__(self, burst, per_minute, max_keys=MAX_TRACKED_KEYS):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """Take a token for `key`. Returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate if self.rate else math.inf
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+_limiters = {}
+
+
+def _limiter(name):
+    config = current_app.config
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters.setdefault(name, TokenBucketLimiter(
+            config[f"AUTH_{name.upper()}_BURST"], config[f"AUTH_{name.upper()}_PER_MINUTE"]
+        ))
+    return limiter
+
+
+def too_many_requests(retry_after, message="Too many attempts, please try again later"):
+    response = jsonify({"error": message})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def auth_rate_limited(view):
+    """Limit credential endpoints per client IP and per submitted email address."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config["AUTH_RATE_LIMIT_ENABLED"]:
+            return view(*args, **kwargs)
+        data = request.get_json(silent=True)
+        email = data.get("email") if isinstance(data, dict) else None
+
+        wait = _limiter("ip").hit(request.remote_addr)
+        if isinstance(email, str) and email:
+            wait = max(wait, _limiter("email").hit(email.strip().lower()))
+        if wait:
+            return too_many_requests(wait)
+        return view(*args, **kwargs)
+    return wrapper
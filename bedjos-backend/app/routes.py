@@ -1,9 +1,47 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from .models import Product, Order, Admin, CartItem, ContactMessage, Customer, db
-import requests
-import base64
-from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, send_from_directory, stream_with_context
+from sqlalchemy.exc import DataError, IntegrityError
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from .models import Product, Order, OrderItem, Admin, CartItem, ContactMessage, Customer, Payment, db
+from .catalog import (
+    bump_catalog_version, cached_catalog_entry, catalog_response, list_products, parse_product_query
+)
+from .pagination import (
+    created_between, keyset_page, ndjson_response, parse_date_range, parse_limit, split_page, wants_ndjson
+)
+from .product_io import detect_format, export_products, import_products, parse_stock
+from .media import (
+    IMMUTABLE_MAX_AGE, ImageRejected, build_srcset, ensure_variant, fallback_name, image_width, media_url,
+    pillow_available, schedule_variants, store_original
+)
+from .search import search_products
+from .serializers import (
+    ORDER_FIELDS, ORDER_ITEM_FIELDS, select_fields, serialize_customer, serialize_entity, serialize_message,
+    serialize_order, serialize_product, serialize_rows
+)
+from .cache import get_cache
+from .metrics import get_metrics
+from .cart import (
+    add_cart_item, apply_cart_changes, cached_cart, invalidate_cart, parse_cart_operations, touch_cart
+)
+from .orders import OrderError, parse_order_items, place_order
+from .auth import (
+    admin_required, current_identity, issue_stream_ticket, issue_token, redeem_stream_ticket, revoke_token
+)
+from .events import ORDERS_TOPIC, event_stream, get_broker, payment_topic, publish_event
+from .idempotency import idempotent
+from .passwords import HashingBusy, hash_password, verify_password
+from .ratelimit import auth_rate_limited, too_many_requests
+from .mailer import queue_email, wake_outbox_worker
+from .payments import (
+    DarajaError, handle_callback, mpesa_configured, normalize_phone, serialize_payment, start_stk_push
+)
+from .stats import read_stats, record_stats, record_status_change
+from .analytics import GROUPS, INTERVALS, default_first, invalidate_analytics, sales_series
+import csv
+import hmac
+import os
+from datetime import datetime, timedelta
 
 api = Blueprint("api", __name__)
 
@@ -18,36 +56,47 @@ def index():
 
 # ==================== AUTHENTICATION ====================
 @api.route("/auth/login", methods=["POST"])
+@auth_rate_limited
 def admin_login():
     data = request.get_json()
     if not data or not data.get("email") or not data.get("password"):
         return jsonify({"error": "Email and password required"}), 400
     
     admin = Admin.query.filter_by(email=data["email"]).first()
-    if not admin or not admin.check_password(data["password"]):
-        return jsonify({"error": "Invalid credentials"}), 401
+    try:
+        if not admin or not verify_password(admin, data["password"]):
+            return jsonify({"error": "Invalid credentials"}), 401
+    except HashingBusy:
+        return too_many_requests(1, "Server busy, please try again")
+    # Saves the upgraded hash if the configured rounds changed
+    db.session.commit()
     
-    token = create_access_token(identity=str(admin.id))
+    token = issue_token(admin, "admin")
     return jsonify({
         "access_token": token,
         "admin": {"email": admin.email}
     }), 200
 
 @api.route("/auth/check", methods=["GET"])
-@jwt_required()
+@admin_required
 def check_auth():
-    admin_id = get_jwt_identity()
-    admin = Admin.query.get(admin_id)
-    return jsonify({"authenticated": True, "email": admin.email}), 200
+    # Served from the identity cache; no query once the token has been seen
+    return jsonify({"authenticated": True, "email": current_identity()["email"]}), 200
 
 @api.route("/auth/logout", methods=["POST"])
 def logout():
-    # For JWT, logout is handled on the client side by removing the token
-    # This endpoint is for consistency and potential future server-side token blacklisting
+    # Revoke the presented token (admin or customer) for the rest of its lifetime.
+    # Without one, logging out is just the client dropping its token, as before.
+    if request.headers.get("Authorization"):
+        try:
+            revoke_token()
+        except (JWTExtendedException, PyJWTError):
+            pass  # Invalid or already revoked: nothing left to revoke
     return jsonify({"message": "Logged out successfully"}), 200
 
 # ==================== CUSTOMER AUTHENTICATION ====================
 @api.route("/auth/customer/signup", methods=["POST"])
+@auth_rate_limited
 def customer_signup():
     data = request.get_json()
     if not data or not data.get("name") or not data.get("email") or not data.get("password"):
@@ -58,17 +107,21 @@ def customer_signup():
     if existing_customer:
         return jsonify({"error": "Email already registered"}), 400
 
+    try:
+        password_hash = hash_password(data["password"])
+    except HashingBusy:
+        return too_many_requests(1, "Server busy, please try again")
     customer = Customer(
         name=data["name"],
         email=data["email"],
-        phone=data.get("phone")
+        phone=data.get("phone"),
+        password_hash=password_hash
     )
-    customer.set_password(data["password"])
 
     db.session.add(customer)
     db.session.commit()
 
-    token = create_access_token(identity=str(customer.id))
+    token = issue_token(customer, "customer")
     return jsonify({
         "access_token": token,
         "customer": {
@@ -80,16 +133,21 @@ def customer_signup():
     }), 201
 
 @api.route("/auth/customer/login", methods=["POST"])
+@auth_rate_limited
 def customer_login():
     data = request.get_json()
     if not data or not data.get("email") or not data.get("password"):
         return jsonify({"error": "Email and password required"}), 400
 
     customer = Customer.query.filter_by(email=data["email"]).first()
-    if not customer or not customer.check_password(data["password"]):
-        return jsonify({"error": "Invalid credentials"}), 401
+    try:
+        if not customer or not verify_password(customer, data["password"]):
+            return jsonify({"error": "Invalid credentials"}), 401
+    except HashingBusy:
+        return too_many_requests(1, "Server busy, please try again")
+    db.session.commit()
 
-    token = create_access_token(identity=str(customer.id))
+    token = issue_token(customer, "customer")
     return jsonify({
         "access_token": token,
         "customer": {
@@ -103,136 +161,316 @@ def customer_login():
 # ==================== PRODUCTS ====================
 @api.route("/products", methods=["GET"])
 def get_products():
-    products = Product.query.all()
-    return jsonify([
-        {
-            "id": p.id,
-            "name": p.name,
-            "price": p.price,
-            "image": p.image,
-            "category": p.category,
-            "description": p.description
-        } for p in products
-    ]), 200
+    try:
+        params = parse_product_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    key = "products?" + repr(sorted(params.items()))
+    try:
+        body, etag = cached_catalog_entry(key, lambda: list_products(**params))
+    except ValueError as e:
+        # Raised for a malformed cursor
+        return jsonify({"error": str(e)}), 400
+    return catalog_response(body, etag)
+
+@api.route("/products/search", methods=["GET"])
+def search():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Search query required"}), 400
+    try:
+        limit = parse_limit(request.args.get("limit"), default=20, maximum=100)
+        offset = int(request.args.get("offset", 0))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if offset < 0:
+        return jsonify({"error": "offset must not be negative"}), 400
+
+    def build():
+        # Fetch one extra row to know whether there is a next page
+        items = search_products(q, limit + 1, offset)
+        return {
+            "items": items[:limit],
+            "next_offset": offset + limit if len(items) > limit else None
+        }
+
+    body, etag = cached_catalog_entry(f"search:{q}:{limit}:{offset}", build)
+    return catalog_response(body, etag)
 
 @api.route("/products/<int:id>", methods=["GET"])
 def get_product(id):
-    product = Product.query.get(id)
-    if not product:
+    def build():
+        row = db.session.execute(select_fields(Product).where(Product.id == id)).first()
+        return serialize_product(row) if row else None
+
+    entry = cached_catalog_entry(f"product:{id}", build)
+    if entry is None:
         return jsonify({"error": "Product not found"}), 404
-    return jsonify({
-        "id": product.id,
-        "name": product.name,
-        "price": product.price,
-        "image": product.image,
-        "category": product.category,
-        "description": product.description
-    }), 200
+    return catalog_response(*entry)
 
 # ==================== ADMIN PRODUCTS ====================
 @api.route("/admin/products", methods=["POST"])
-@jwt_required()
+@admin_required
 def admin_add_product():
     data = request.get_json()
     if not data or not data.get("name") or not data.get("price"):
         return jsonify({"error": "Name and price required"}), 400
+    try:
+        # The order oversell guard relies on stock being a non-negative integer or null
+        stock = parse_stock(data.get("stock"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     product = Product(
         name=data["name"],
         price=data["price"],
         image=data.get("image"),
         category=data.get("category"),
-        description=data.get("description")
+        description=data.get("description"),
+        stock=stock
     )
     db.session.add(product)
+    record_stats(product_count=1)
     db.session.commit()
+    bump_catalog_version()
     return jsonify({"message": "Product created", "id": product.id}), 201
 
 @api.route("/admin/products/<int:id>", methods=["PUT"])
-@jwt_required()
+@admin_required
 def admin_update_product(id):
     product = Product.query.get(id)
     if not product:
         return jsonify({"error": "Product not found"}), 404
     
     data = request.get_json()
+    if "stock" in data:
+        try:
+            stock = parse_stock(data["stock"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
     if data.get("name"):
         product.name = data["name"]
     if data.get("price"):
         product.price = data["price"]
-    if data.get("image"):
+    if data.get("image") and data["image"] != product.image:
         product.image = data["image"]
-    if data.get("category"):
+        # An image URL set by hand replaces any uploaded one and its variants
+        product.image_hash = None
+        product.srcset = None
+    if data.get("category") and data["category"] != product.category:
         product.category = data["category"]
+        # Sales by category group order items by their product's current category
+        invalidate_analytics(group="category")
     if data.get("description"):
         product.description = data["description"]
+    if "stock" in data:
+        product.stock = stock
     
     db.session.commit()
+    bump_catalog_version()
     return jsonify({"message": "Product updated"}), 200
 
 @api.route("/admin/products/<int:id>", methods=["DELETE"])
-@jwt_required()
+@admin_required
 def admin_delete_product(id):
     product = Product.query.get(id)
     if not product:
         return jsonify({"error": "Product not found"}), 404
+    # SQLite doesn't enforce order_item's foreign key; deleting would orphan order lines
+    if db.session.scalar(db.select(OrderItem.id).where(OrderItem.product_id == id).limit(1)):
+        return jsonify({
+            "error": "Product has orders and can't be deleted; set its stock to 0 to stop selling it"
+        }), 409
     
+    CartItem.query.filter_by(product_id=id).delete()
     db.session.delete(product)
+    record_stats(product_count=-1)
     db.session.commit()
+    bump_catalog_version()
     return jsonify({"message": "Product deleted"}), 200
 
+@api.route("/admin/products/import", methods=["POST"])
+@admin_required
+def admin_import_products():
+    """
+    Bulk upsert from CSV or NDJSON, sent as the raw body or as a `file` upload.
+    The format comes from ?format=, else the filename or content type, else CSV.
+    """
+    upload = request.files.get("file")
+    try:
+        fmt = detect_format(
+            request.args.get("format"),
+            upload.filename if upload else None,
+            upload.mimetype if upload else request.mimetype
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        summary = import_products(upload.stream if upload else request.stream, fmt)
+        invalidate_analytics(group="category")
+        db.session.commit()
+    except (IntegrityError, DataError, UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        current_app.logger.info("Product import rejected: %s", e)
+        return jsonify({
+            "error": "Import failed; nothing was saved. Check the file is valid UTF-8 CSV or NDJSON."
+        }), 400
+    bump_catalog_version()
+    return jsonify(summary), 200
+
+@api.route("/admin/products/export", methods=["GET"])
+@admin_required
+def admin_export_products():
+    try:
+        fmt = detect_format(request.args.get("format", "csv"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = Response(
+        stream_with_context(export_products(fmt)),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson"
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=products-{datetime.utcnow():%Y%m%d}.{fmt}"
+    )
+    return response
+
+@api.route("/admin/products/<int:id>/image", methods=["POST"])
+@admin_required
+def admin_upload_product_image(id):
+    """
+    Store an uploaded image (`file`) under its content hash and point the product at it.
+    Resized variants are built in the background; /api/media builds any still missing.
+    """
+    product = Product.query.get(id)
+    if not product:
+        return jsonify({"error": "Product not found"}), 404
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify({"error": "Image file required"}), 400
+
+    config = current_app.config
+    try:
+        image_hash, name = store_original(upload.stream, config["MEDIA_ROOT"], config["MEDIA_MAX_UPLOAD_BYTES"])
+    except ImageRejected as e:
+        return jsonify({"error": str(e)}), 400
+
+    resize = pillow_available()
+    if resize:
+        path = os.path.join(config["MEDIA_ROOT"], name)
+        try:
+            width = image_width(path)
+        except ImageRejected as e:
+            os.unlink(path)  # right signature, unreadable image; nothing can refer to it
+            return jsonify({"error": str(e)}), 400
+        fallback = fallback_name(image_hash, width, config["IMAGE_WIDTHS"], config["IMAGE_FALLBACK_WIDTH"])
+        product.image = media_url(fallback)
+        product.srcset = build_srcset(image_hash, width, config["IMAGE_WIDTHS"])
+    else:
+        current_app.logger.warning("Pillow is not installed; serving %s without resized variants", name)
+        product.image = media_url(name)
+        product.srcset = None
+    product.image_hash = image_hash
+    db.session.commit()
+    bump_catalog_version()
+    if resize:
+        schedule_variants(config, name)
+    return jsonify({"message": "Image uploaded", "image": product.image, "srcset": product.srcset}), 200
+
+# ==================== MEDIA ====================
+@api.route("/media/<name>", methods=["GET"])
+def media(name):
+    # Names are content hashes, so a response never changes and may be cached forever
+    if not ensure_variant(current_app.config, name):
+        return jsonify({"error": "Not found"}), 404
+    response = send_from_directory(current_app.config["MEDIA_ROOT"], name, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # ==================== ORDERS ====================
 @api.route("/orders", methods=["POST"])
+@idempotent
 def create_order():
     data = request.get_json()
-    if not data or not data.get("customer_name") or not data.get("phone") or not data.get("total"):
-        return jsonify({"error": "Customer name, phone, and total required"}), 400
-    
-    order = Order(
-        customer_name=data["customer_name"],
-        phone=data["phone"],
-        email=data.get("email"),
-        total=data["total"],
-        status="pending"
-    )
-    db.session.add(order)
-    db.session.commit()
-    return jsonify({"message": "Order placed", "order_id": order.id}), 201
+    if not data or not data.get("customer_name") or not data.get("phone"):
+        return jsonify({"error": "Customer name and phone required"}), 400
+
+    # The total is computed from current product prices; any client "total" is ignored
+    try:
+        quantities = parse_order_items(data.get("items"))
+        order, stock_changed = place_order(
+            data["customer_name"], data["phone"], data.get("email"), quantities
+        )
+    except OrderError as e:
+        return jsonify({"error": e.message, **e.details}), e.status
+
+    if stock_changed:
+        bump_catalog_version()
+    publish_event(current_app, ORDERS_TOPIC, "order.created", serialize_entity(order, ORDER_FIELDS))
+    return jsonify({"message": "Order placed", "order_id": order.id, "total": order.total}), 201
 
 @api.route("/orders/<int:id>", methods=["GET"])
 def get_order(id):
-    order = Order.query.get(id)
+    order = db.session.execute(select_fields(Order).where(Order.id == id)).first()
     if not order:
         return jsonify({"error": "Order not found"}), 404
+    items = db.session.execute(
+        db.select(OrderItem.product_id, Product.name, OrderItem.quantity, OrderItem.price)
+        # Outer join: lines whose product was deleted before deletes were blocked still count
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id == order.id)
+        .order_by(OrderItem.id)
+    ).all()
     return jsonify({
-        "id": order.id,
-        "customer_name": order.customer_name,
-        "phone": order.phone,
-        "email": order.email,
-        "total": order.total,
-        "status": order.status,
-        "created_at": order.created_at.isoformat() if order.created_at else None
+        **serialize_order(order),
+        "items": serialize_rows(ORDER_ITEM_FIELDS, items)
     }), 200
 
 # ==================== ADMIN ORDERS ====================
+def admin_listing(model, query, serialize):
+    """
+    Shared admin list handling for a column query built with `select_fields`.
+    `from`/`to` filter on created_at, then the result is either an
+    NDJSON stream (format=ndjson), a keyset page (limit/cursor, newest first) or,
+    for older clients, the full array.
+    """
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = created_between(query, model.created_at, start, end)
+
+    if wants_ndjson():
+        return ndjson_response(query.order_by(model.id.desc()), serialize)
+
+    if "limit" not in request.args and "cursor" not in request.args:
+        rows = db.session.execute(query.order_by(model.id.desc()))
+        return jsonify([serialize(row) for row in rows]), 200
+
+    try:
+        query, limit = keyset_page(query, model.id, request.args, descending=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rows, next_cursor = split_page(
+        db.session.execute(query).all(), limit, key=lambda row: row.id
+    )
+    return jsonify({
+        "items": [serialize(row) for row in rows],
+        "next_cursor": next_cursor
+    }), 200
+
 @api.route("/admin/orders", methods=["GET"])
-@jwt_required()
+@admin_required
 def admin_orders():
-    orders = Order.query.order_by(Order.created_at.desc()).all()
-    return jsonify([
-        {
-            "id": o.id,
-            "customer_name": o.customer_name,
-            "phone": o.phone,
-            "email": o.email,
-            "total": o.total,
-            "status": o.status,
-            "created_at": o.created_at.isoformat() if o.created_at else None
-        } for o in orders
-    ]), 200
+    query = select_fields(Order)
+    if request.args.get("status"):
+        query = query.where(Order.status == request.args["status"])
+    return admin_listing(Order, query, serialize_order)
 
 @api.route("/admin/orders/<int:id>/status", methods=["PUT"])
-@jwt_required()
+@admin_required
 def update_order_status(id):
     order = Order.query.get(id)
     if not order:
@@ -242,8 +480,12 @@ def update_order_status(id):
     if not data.get("status"):
         return jsonify({"error": "Status required"}), 400
     
+    old_status = order.status
     order.status = data["status"]
+    record_status_change(order, old_status)
+    invalidate_analytics("status")
     db.session.commit()
+    publish_event(current_app, ORDERS_TOPIC, "order.updated", serialize_entity(order, ORDER_FIELDS))
     return jsonify({"message": "Order status updated"}), 200
 
 # ==================== CART ====================
@@ -253,56 +495,40 @@ def add_to_cart():
     if not data or not data.get("product_id") or not data.get("session_id"):
         return jsonify({"error": "Product ID and session ID required"}), 400
     
-    # Check if product exists
-    product = Product.query.get(data["product_id"])
-    if not product:
+    quantity = data.get("quantity", 1)
+    if not isinstance(quantity, int) or quantity < 1:
+        return jsonify({"error": "Quantity must be a positive integer"}), 400
+
+    if not add_cart_item(data["session_id"], data["product_id"], quantity):
+        db.session.rollback()
         return jsonify({"error": "Product not found"}), 404
-    
-    # Check if item already in cart
-    existing_item = CartItem.query.filter_by(
-        product_id=data["product_id"],
-        session_id=data["session_id"]
-    ).first()
-    
-    if existing_item:
-        existing_item.quantity += data.get("quantity", 1)
-    else:
-        cart_item = CartItem(
-            product_id=data["product_id"],
-            quantity=data.get("quantity", 1),
-            session_id=data["session_id"]
-        )
-        db.session.add(cart_item)
-    
+
+    invalidate_cart(data["session_id"])
     db.session.commit()
     return jsonify({"message": "Added to cart"}), 201
 
 @api.route("/cart/<session_id>", methods=["GET"])
 def get_cart(session_id):
-    items = CartItem.query.filter_by(session_id=session_id).all()
-    cart_items = []
-    total = 0
-    
-    for item in items:
-        product = Product.query.get(item.product_id)
-        if product:
-            item_total = product.price * item.quantity
-            total += item_total
-            cart_items.append({
-                "id": item.id,
-                "product_id": item.product_id,
-                "product_name": product.name,
-                "product_price": product.price,
-                "product_image": product.image,
-                "quantity": item.quantity,
-                "item_total": item_total
-            })
-    
-    return jsonify({
-        "items": cart_items,
-        "total": total,
-        "count": len(cart_items)
-    }), 200
+    return Response(cached_cart(session_id), mimetype="application/json")
+
+@api.route("/cart/<session_id>/batch", methods=["POST"])
+def batch_update_cart(session_id):
+    data = request.get_json()
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "Operations required"}), 400
+    try:
+        changes = parse_cart_operations(data.get("operations"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    missing = apply_cart_changes(session_id, changes)
+    if missing:
+        db.session.rollback()
+        return jsonify({"error": "Product not found", "product_ids": missing}), 404
+
+    invalidate_cart(session_id)
+    db.session.commit()
+    return Response(cached_cart(session_id), mimetype="application/json")
 
 @api.route("/cart/<session_id>/item/<int:item_id>", methods=["DELETE"])
 def remove_cart_item(session_id, item_id):
@@ -311,12 +537,15 @@ def remove_cart_item(session_id, item_id):
         return jsonify({"error": "Item not found in cart"}), 404
     
     db.session.delete(item)
+    touch_cart(session_id)
+    invalidate_cart(session_id)
     db.session.commit()
     return jsonify({"message": "Item removed from cart"}), 200
 
 @api.route("/cart/<session_id>", methods=["DELETE"])
 def clear_cart(session_id):
     CartItem.query.filter_by(session_id=session_id).delete()
+    invalidate_cart(session_id)
     db.session.commit()
     return jsonify({"message": "Cart cleared"}), 200
 
@@ -334,113 +563,208 @@ def contact_message():
         message=data["message"]
     )
     db.session.add(message)
-    db.session.commit()
-
-    # Send email notification
-    try:
-        from flask_mail import Message
-        from . import mail
-
-        msg = Message(
-            subject=f"New Contact Message from {data['name']}",
-            sender=data["email"],
-            recipients=["admin@bedjos.co.ke"],  # Change this to your admin email
-            body=f"""
+    # Queued in the same transaction; the outbox worker delivers it off the request path
+    queue_email(
+        subject=f"New Contact Message from {data['name']}",
+        reply_to=data["email"],
+        body=f"""
 New contact message received:
 
 Name: {data['name']}
 Email: {data['email']}
-Phone: {data.get('phone', 'Not provided')}
+Phone: {data.get('phone') or 'Not provided'}
 
 Message:
 {data['message']}
 
-Sent at: {message.created_at}
-            """
-        )
-        mail.send(msg)
-        print(f"📧 Email sent to admin about contact from {data['name']}")
-    except Exception as e:
-        print(f"❌ Failed to send email: {str(e)}")
-        # Don't fail the request if email fails
+Sent at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
+"""
+    )
+    db.session.commit()
+    wake_outbox_worker()
 
     return jsonify({"message": "Message sent successfully"}), 201
 
 @api.route("/admin/messages", methods=["GET"])
-@jwt_required()
+@admin_required
 def get_messages():
-    messages = ContactMessage.query.order_by(ContactMessage.created_at.desc()).all()
-    return jsonify([
-        {
-            "id": m.id,
-            "name": m.name,
-            "email": m.email,
-            "phone": m.phone,
-            "message": m.message,
-            "created_at": m.created_at.isoformat() if m.created_at else None
-        } for m in messages
-    ]), 200
+    return admin_listing(ContactMessage, select_fields(ContactMessage), serialize_message)
+
+# ==================== ADMIN CUSTOMERS ====================
+@api.route("/admin/customers", methods=["GET"])
+@admin_required
+def get_customers():
+    return admin_listing(Customer, select_fields(Customer), serialize_customer)
 
 # ==================== M-PESA PAYMENTS ====================
 @api.route("/payments/mpesa/stk-push", methods=["POST"])
+@idempotent
 def mpesa_stk_push():
     """
-    Simplified M-Pesa STK Push endpoint
-    In production, you would integrate with Safaricom Daraja API
+    Ask Daraja to prompt the customer's phone for an order's total.
+    The outcome arrives later on the callback; poll /payments/verify/<reference>.
     """
+    if not mpesa_configured(current_app.config):
+        return jsonify({"error": "M-Pesa payments are not configured"}), 503
+
     data = request.get_json()
-    
-    if not data or not data.get("phone") or not data.get("amount"):
-        return jsonify({"error": "Phone and amount required"}), 400
-    
-    # Simulate M-Pesa payment process
-    # In production, you would:
-    # 1. Generate timestamp
-    # 2. Generate password (Base64 encoded)
-    # 3. Make request to Safaricom API
-    # 4. Handle callback
-    
-    phone = data["phone"]
-    amount = data["amount"]
-    
-    # Remove leading '0' and add country code
-    if phone.startswith("0"):
-        phone = "254" + phone[1:]
-    
+    if not data or not data.get("phone") or not data.get("order_id"):
+        return jsonify({"error": "Phone and order_id required"}), 400
+    try:
+        phone = normalize_phone(data["phone"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    order = Order.query.get(data["order_id"])
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+    if Payment.query.filter_by(order_id=order.id, status="completed").first():
+        return jsonify({"error": "Order is already paid"}), 409
+
+    try:
+        payment, customer_message = start_stk_push(current_app.config, order, phone)
+    except DarajaError as e:
+        current_app.logger.warning("STK push for order %s failed: %s", order.id, e)
+        return jsonify({"error": str(e)}), 502
+
     return jsonify({
         "success": True,
-        "message": "STK Push initiated. Enter PIN on your phone to complete payment.",
+        "message": customer_message or "STK Push initiated. Enter PIN on your phone to complete payment.",
         "payment_data": {
             "phone": phone,
-            "amount": amount,
-            "reference": f"BEDJOS{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            "timestamp": datetime.now().isoformat()
+            "amount": payment.amount,
+            "order_id": order.id,
+            "reference": payment.checkout_request_id,
+            "timestamp": datetime.utcnow().isoformat()
         }
     }), 200
 
+@api.route("/payments/mpesa/callback", methods=["POST"])
+def mpesa_callback():
+    # Daraja doesn't sign callbacks, so the registered URL carries a shared token.
+    # Without one configured there is no way to tell Daraja from anyone else.
+    expected = current_app.config["MPESA_CALLBACK_TOKEN"]
+    if not expected or not hmac.compare_digest(request.args.get("token", ""), expected):
+        return jsonify({"ResultCode": 1, "ResultDesc": "Rejected"}), 403
+    try:
+        payment = handle_callback(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"ResultCode": 1, "ResultDesc": str(e)}), 400
+    if payment is None:
+        current_app.logger.warning("M-Pesa callback for an unknown payment")
+    elif payment.status != "pending":
+        publish_event(
+            current_app, payment_topic(payment.checkout_request_id), "payment.updated", serialize_payment(payment)
+        )
+    # Acknowledge either way so Daraja stops retrying
+    return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"}), 200
+
 @api.route("/payments/verify/<reference>", methods=["GET"])
 def verify_payment(reference):
-    """
-    Verify payment status (mock for now)
-    """
+    """Payment status as last reported by the Daraja callback; no upstream call."""
+    payment = Payment.query.filter_by(checkout_request_id=reference).first()
+    if not payment:
+        return jsonify({"error": "Payment not found"}), 404
+    return jsonify(serialize_payment(payment)), 200
+
+# ==================== EVENTS ====================
+@api.route("/events/ticket", methods=["POST"])
+@admin_required
+def events_ticket():
+    # EventSource can't set headers; this keeps the JWT itself out of URLs and access logs
     return jsonify({
-        "status": "completed",  # or "pending", "failed"
-        "reference": reference,
-        "verified_at": datetime.now().isoformat()
+        "ticket": issue_stream_ticket(current_identity()),
+        "expires_in": current_app.config["EVENTS_TICKET_SECONDS"]
     }), 200
 
+@api.route("/events", methods=["GET"])
+def events():
+    """
+    Server-sent events, instead of polling:
+    - ?payment=<reference> follows one payment, starting with its current state
+    - ?topics=orders&ticket=<from POST /events/ticket> streams created and updated orders
+    """
+    reference = request.args.get("payment")
+    wants_orders = "orders" in request.args.get("topics", "").split(",")
+    if not reference and not wants_orders:
+        return jsonify({"error": "Pass payment=<reference> or topics=orders"}), 400
+
+    topics = []
+    if wants_orders:
+        # Tickets are only issued to admins
+        if redeem_stream_ticket(request.args.get("ticket", "")) is None:
+            return jsonify({"error": "Missing, invalid or expired ticket"}), 401
+        topics.append(ORDERS_TOPIC)
+    if reference:
+        topics.append(payment_topic(reference))
+
+    # Subscribe before reading the current state, so a callback landing in between isn't lost
+    subscription = get_broker(current_app.config).subscribe(topics)
+    initial = []
+    if reference:
+        payment = Payment.query.filter_by(checkout_request_id=reference).first()
+        if not payment:
+            subscription.close()
+            return jsonify({"error": "Payment not found"}), 404
+        initial.append(("payment.updated", serialize_payment(payment)))
+
+    config = current_app.config
+    response = Response(
+        event_stream(subscription, initial, config["EVENTS_HEARTBEAT_SECONDS"], config["EVENTS_MAX_STREAM_SECONDS"]),
+        mimetype="text/event-stream"
+    )
+    response.call_on_close(subscription.close)
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 # ==================== STATS & DASHBOARD ====================
 @api.route("/admin/stats", methods=["GET"])
-@jwt_required()
+@admin_required
 def get_stats():
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(db.func.sum(Order.total)).scalar() or 0
-    pending_orders = Order.query.filter_by(status="pending").count()
-    total_products = Product.query.count()
-    
+    return jsonify(read_stats()), 200
+
+@api.route("/admin/cache", methods=["GET"])
+@admin_required
+def get_cache_stats():
+    """Hit, miss and eviction counters of this worker's cache (per tier for the near cache)."""
+    return jsonify(get_cache().stats()), 200
+
+@api.route("/admin/metrics", methods=["GET"])
+@admin_required
+def get_metrics_text():
+    """This worker's request, SQL and cache metrics in the Prometheus text format."""
+    if not current_app.config["METRICS_ENABLED"]:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(
+        get_metrics().render(get_cache().stats()), mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@api.route("/admin/analytics", methods=["GET"])
+@admin_required
+def get_analytics():
+    interval = request.args.get("interval", "day")
+    group = request.args.get("group") or None
+    if interval not in INTERVALS:
+        return jsonify({"error": f"interval must be one of {', '.join(INTERVALS)}"}), 400
+    if group is not None and group not in GROUPS:
+        return jsonify({"error": f"group must be one of {', '.join(GROUPS)}"}), 400
+
+    try:
+        start, end = parse_date_range(request.args)
+        last = (end - timedelta(microseconds=1)).date() if end else datetime.utcnow().date()
+        first = start.date() if start else default_first(last, interval)
+        if first > last:
+            return jsonify({"error": "'from' must not be after 'to'"}), 400
+        series = sales_series(interval, group, first, last)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     return jsonify({
-        "total_orders": total_orders,
-        "total_revenue": float(total_revenue),
-        "pending_orders": pending_orders,
-        "total_products": total_products
+        "interval": interval,
+        "group": group,
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "series": series
     }), 200
@@ -0,0 +1,48 @@
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from . import MIGRATIONS_DIR, db
+
+# Tables maintained outside the models (FTS5 index and its shadow tables),
+# which autogenerate would otherwise try to drop.
+UNMANAGED_TABLE_PREFIXES = ("product_fts",)
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    return not (type_ == "table" and name.startswith(UNMANAGED_TABLE_PREFIXES))
+
+
+def schema_revisions(engine=None):
+    """Return (applied, expected) migration heads for a database (default: the app's)."""
+    expected = set(ScriptDirectory(MIGRATIONS_DIR).get_heads())
+    with (engine or db.engine).connect() as conn:
+        applied = set(MigrationContext.configure(conn).get_current_heads())
+    return applied, expected
+
+
+def check_schema(engine=None):
+    applied, expected = schema_revisions(engine)
+    if applied != expected:
+        raise SchemaOutOfDate(
+            f"Database schema is at {', '.join(sorted(applied)) or 'no revision'} but the code "
+            f"expects {', '.join(sorted(expected))}. Run `flask --app app bedjos init-db` (or `flask db upgrade`) first."
+        )
+
+
+def check_schema_at(url):
+    """
+    check_schema() without building the app, for the gunicorn master: create_app()
+    would start background threads there that forked workers then believe are running.
+    Uses a throwaway unpooled engine, so no connection outlives the check.
+    """
+    engine = create_engine(url, poolclass=NullPool)
+    try:
+        check_schema(engine)
+    finally:
+        engine.dispose()
@@ -0,0 +1,60 @@
+import re
+
+from . import db
+from .models import Product
+from .serializers import PRODUCT_FIELDS, select_fields, serialize_rows
+
+# product_fts is an external-content FTS5 index over product, created by migration
+# 0002 along with triggers that keep it in sync with every product write.
+
+# bm25() weights, in FTS column order: name, description, category
+SEARCH_SQL = """
+    SELECT p.id, p.name, p.price, p.image, p.category, p.description, p.stock, p.srcset
+    FROM product_fts
+    JOIN product AS p ON p.id = product_fts.rowid
+    WHERE product_fts MATCH :query
+    ORDER BY bm25(product_fts, 10.0, 1.0, 4.0)
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def uses_fts():
+    return db.engine.dialect.name == "sqlite"
+
+
+def build_match_query(q):
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a prefix
+    so results keep up with the user typing. Quoting keeps FTS syntax out of user input.
+    """
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_products(q, limit, offset):
+    if uses_fts():
+        match = build_match_query(q)
+        if match is None:
+            return []
+        rows = db.session.execute(
+            db.text(SEARCH_SQL), {"query": match, "limit": limit, "offset": offset}
+        ).all()
+    else:
+        # No FTS5 outside SQLite; fall back to a case-insensitive scan
+        pattern = f"%{q.strip()}%"
+        rows = db.session.execute(
+            select_fields(Product)
+            .where(db.or_(
+                Product.name.ilike(pattern),
+                Product.description.ilike(pattern),
+                Product.category.ilike(pattern)
+            ))
+            .order_by(Product.id)
+            .limit(limit)
+            .offset(offset)
+        ).all()
+    return serialize_rows(PRODUCT_FIELDS, rows)
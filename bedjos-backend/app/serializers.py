@@ -0,0 +1,48 @@
+from . import db
+from .models import ContactMessage, Customer, Order, Product
+
+# Column tuples for each API shape. Listings select just these columns and zip each
+# result row with its field names, skipping ORM entity loading and hand-built dicts.
+# Datetimes are left as they are; the JSON provider writes them as ISO 8601.
+PRODUCT_FIELDS = ("id", "name", "price", "image", "category", "description", "stock", "srcset")
+ORDER_FIELDS = ("id", "customer_name", "phone", "email", "total", "status", "created_at")
+MESSAGE_FIELDS = ("id", "name", "email", "phone", "message", "created_at")
+CUSTOMER_FIELDS = ("id", "name", "email", "phone", "created_at")
+ORDER_ITEM_FIELDS = ("product_id", "product_name", "quantity", "price")
+CART_ITEM_FIELDS = (
+    "id", "product_id", "product_name", "product_price", "product_image", "quantity", "item_total"
+)
+
+MODEL_FIELDS = {
+    Product: PRODUCT_FIELDS,
+    Order: ORDER_FIELDS,
+    ContactMessage: MESSAGE_FIELDS,
+    Customer: CUSTOMER_FIELDS,
+}
+
+
+def select_fields(model, fields=None):
+    """A SELECT of `fields` (by default the model's API fields), in that order."""
+    return db.select(*[getattr(model, f) for f in fields or MODEL_FIELDS[model]])
+
+
+def row_serializer(fields):
+    """Build a function turning one result row of `fields` into a dict."""
+    def serialize(row):
+        return dict(zip(fields, row))
+    return serialize
+
+
+def serialize_entity(entity, fields):
+    """The same shape from an already loaded model instance."""
+    return {f: getattr(entity, f) for f in fields}
+
+
+def serialize_rows(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+serialize_product = row_serializer(PRODUCT_FIELDS)
+serialize_order = row_serializer(ORDER_FIELDS)
+serialize_message = row_serializer(MESSAGE_FIELDS)
+serialize_customer = row_serializer(CUSTOMER_FIELDS)
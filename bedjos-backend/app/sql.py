@@ -0,0 +1,29 @@
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+
+
+def upsert_insert(table):
+    """INSERT construct with on_conflict_do_update() support for the active database."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+
+def configure_engine(app):
+    """Apply SQLITE_PRAGMAS to every new connection; other databases use pool settings only."""
+    engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = app.config["SQLITE_PRAGMAS"]
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
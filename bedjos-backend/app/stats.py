@@ -0,0 +1,119 @@
+from . import db
+from .cache import get_cache, invalidate_after_commit
+from .json_provider import dumps, loads
+from .models import DailyStats, Order, Product
+from .sql import upsert_insert
+
+ALL_TIME = "all"
+COUNTERS = ("order_count", "revenue", "pending_count", "product_count")
+STATS_CACHE_KEY = "stats:all"
+STATS_TTL_SECONDS = 60
+
+
+def record_stats(day=None, **deltas):
+    """
+    Add counter deltas to the all-time row and, when given, the row for `day`,
+    in the caller's transaction. Increments are applied in SQL, so concurrent
+    writers never lose updates.
+    """
+    values = {name: deltas.get(name, 0) for name in COUNTERS}
+    rows = [{"day": ALL_TIME, **values}]
+    if day is not None:
+        rows.append({"day": day.strftime("%Y-%m-%d"), **values, "product_count": 0})
+    stmt = upsert_insert(DailyStats.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day"],
+        set_={name: getattr(DailyStats, name) + getattr(stmt.excluded, name) for name in COUNTERS}
+    )
+    db.session.execute(stmt, rows)
+    invalidate_after_commit(db.session, STATS_CACHE_KEY)
+
+
+def record_new_order(order):
+    record_stats(
+        order.created_at,
+        order_count=1,
+        revenue=order.total,
+        pending_count=1 if order.status == "pending" else 0
+    )
+
+
+def record_status_change(order, old_status):
+    was_pending = old_status == "pending"
+    is_pending = order.status == "pending"
+    if was_pending != is_pending:
+        record_stats(order.created_at, pending_count=1 if is_pending else -1)
+
+
+def read_stats():
+    cache = get_cache()
+    cached = cache.get(STATS_CACHE_KEY)
+    if cached is not None:
+        return loads(cached)
+    stats = _read_stats_row()
+    cache.set(STATS_CACHE_KEY, dumps(stats), STATS_TTL_SECONDS)
+    return stats
+
+
+def _read_stats_row():
+    row = db.session.get(DailyStats, ALL_TIME)
+    if row is None:
+        # Normally seeded by migration 0002; rebuild if the table was emptied
+        recompute_stats()
+        row = db.session.get(DailyStats, ALL_TIME)
+    return {
+        "total_orders": row.order_count,
+        "total_revenue": float(row.revenue),
+        "pending_orders": row.pending_count,
+        "total_products": row.product_count
+    }
+
+
+def recompute_stats():
+    """
+    Rebuild every rollup row from the orders and products tables.
+    Returns the days whose stored counters disagreed with the rebuilt ones.
+    """
+    day = db.cast(db.func.date(Order.created_at), db.String)
+    grouped = db.session.execute(
+        db.select(
+            day,
+            db.func.count(Order.id),
+            db.func.coalesce(db.func.sum(Order.total), 0),
+            db.func.coalesce(db.func.sum(db.case((Order.status == "pending", 1), else_=0)), 0)
+        ).group_by(day)
+    ).all()
+
+    rows = {
+        key: {"day": key, "order_count": count, "revenue": float(revenue),
+              "pending_count": pending, "product_count": 0}
+        for key, count, revenue, pending in grouped
+    }
+    rows[ALL_TIME] = {
+        "day": ALL_TIME,
+        "order_count": sum(r["order_count"] for r in rows.values()),
+        "revenue": sum(r["revenue"] for r in rows.values()),
+        "pending_count": sum(r["pending_count"] for r in rows.values()),
+        "product_count": db.session.scalar(db.select(db.func.count(Product.id)))
+    }
+
+    stored = {
+        row.day: {"day": row.day, **{name: getattr(row, name) for name in COUNTERS}}
+        for row in DailyStats.query.all()
+    }
+    drifted = sorted(
+        key for key in set(rows) | set(stored)
+        if not _same(rows.get(key), stored.get(key))
+    )
+
+    db.session.execute(db.delete(DailyStats))
+    db.session.execute(db.insert(DailyStats), list(rows.values()))
+    invalidate_after_commit(db.session, STATS_CACHE_KEY)
+    db.session.commit()
+    return drifted
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is b
+    return all(abs(a[name] - b[name]) < 0.005 for name in COUNTERS)
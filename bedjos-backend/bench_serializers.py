@@ -0,0 +1,107 @@
+"""
+Microbenchmark: per-row cost of the admin order and product listings,
+ORM entities + hand-built dicts + stdlib JSON (before) versus column tuples + orjson (after).
+
+    python bench_serializers.py [--rows 20000] [--repeat 5]
+
+Runs against a throwaway SQLite database; DATABASE_URL is ignored.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app, db
+from app.json_provider import dumps
+from app.models import Order, Product
+from app.serializers import select_fields, serialize_order, serialize_product
+
+
+def order_dict(o):
+    return {
+        "id": o.id,
+        "customer_name": o.customer_name,
+        "phone": o.phone,
+        "email": o.email,
+        "total": o.total,
+        "status": o.status,
+        "created_at": o.created_at.isoformat() if o.created_at else None
+    }
+
+
+def product_dict(p):
+    return {
+        "id": p.id,
+        "name": p.name,
+        "price": p.price,
+        "image": p.image,
+        "category": p.category,
+        "description": p.description,
+        "stock": p.stock
+    }
+
+
+def seed(rows):
+    start = datetime(2024, 1, 1)
+    db.session.execute(db.insert(Order), [
+        {
+            "customer_name": f"Customer {i}", "phone": f"07{i:08d}", "email": f"c{i}@example.com",
+            "total": 100.0 + i, "status": "pending", "created_at": start + timedelta(minutes=i)
+        } for i in range(rows)
+    ])
+    db.session.execute(db.insert(Product), [
+        {
+            "name": f"Product {i}", "price": 10.0 + i, "image": f"/img/{i}.jpg",
+            "category": f"Category {i % 20}", "description": "A fine product. " * 8, "stock": i
+        } for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    stdlib_json = DefaultJSONProvider(app)
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+
+        cases = {
+            "orders": (
+                lambda: stdlib_json.dumps([order_dict(o) for o in db.session.execute(db.select(Order)).scalars()]),
+                lambda: dumps([serialize_order(r) for r in db.session.execute(select_fields(Order))]),
+            ),
+            "products": (
+                lambda: stdlib_json.dumps([product_dict(p) for p in db.session.execute(db.select(Product)).scalars()]),
+                lambda: dumps([serialize_product(r) for r in db.session.execute(select_fields(Product))]),
+            ),
+        }
+        print(f"{args.rows} rows, best of {args.repeat}")
+        for name, (before, after) in cases.items():
+            before_us = best_of(args.repeat, before) / args.rows * 1e6
+            after_us = best_of(args.repeat, after) / args.rows * 1e6
+            print(f"{name:9} before {before_us:6.2f} µs/row   after {after_us:6.2f} µs/row   "
+                  f"({before_us / after_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,140 @@
 import os
 
+from dotenv import load_dotenv
+
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'instance', 'bedjos.db')}")
+    # Hosting providers often hand out the scheme SQLAlchemy no longer accepts
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url):
+    if url.startswith("sqlite"):
+        # SQLite has one writer at a time; per-connection tuning is applied with SQLITE_PRAGMAS
+        return {}
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'instance', 'bedjos.db')}"
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Applied to every new SQLite connection. WAL lets readers run alongside the writer.
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "temp_store": "MEMORY",
+    }
     JWT_SECRET_KEY = "bedjos-super-secret-2026-key-change-in-production"
+    # How long a verified token's identity is reused without verifying it again.
+    # Logout still takes effect at once in every worker (see app/auth.py). Only with
+    # CACHE_BACKEND "redis" or "near" do repeated calls skip the database entirely:
+    # with "memory" each hit still looks the token up in revoked_token (one primary-key
+    # query instead of the user query it replaces).
+    JWT_IDENTITY_CACHE_SECONDS = int(os.environ.get("JWT_IDENTITY_CACHE_SECONDS", 30))
+    IDEMPOTENCY_TTL_HOURS = 24
+    # How long a key stays reserved while its first request runs. If that worker dies,
+    # retries get a 409 only until this passes; keep it above the slowest request.
+    IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", 120))
+
+    # Stored hashes are upgraded on the next successful login when this changes
+    PASSWORD_HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", 29000))
+    # Hashing runs in this many processes per worker (0 hashes in the request thread).
+    # Beyond workers + queue hashes in flight, auth requests get a 429.
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 8))
+    PASSWORD_HASH_TIMEOUT = 10
+    # Token buckets on the login/signup routes: a burst, then a steady refill per minute
+    AUTH_RATE_LIMIT_ENABLED = os.environ.get("AUTH_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    AUTH_IP_BURST = int(os.environ.get("AUTH_IP_BURST", 20))
+    AUTH_IP_PER_MINUTE = int(os.environ.get("AUTH_IP_PER_MINUTE", 10))
+    AUTH_EMAIL_BURST = int(os.environ.get("AUTH_EMAIL_BURST", 5))
+    AUTH_EMAIL_PER_MINUTE = int(os.environ.get("AUTH_EMAIL_PER_MINUTE", 2))
+    # Reverse proxies (nginx, a platform router) in front of the app. Set it so the
+    # per-IP limits see clients' addresses from X-Forwarded-For rather than the
+    # proxy's; never more than there really are, or clients can pick their own IP.
+    TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))
+
+    MAIL_SERVER = os.environ.get("MAIL_SERVER", "localhost")
+    MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "true").lower() == "true"
+    MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
+    MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
+    MAIL_TIMEOUT = 10
+    MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "noreply@bedjos.co.ke")
+    MAIL_ADMIN_RECIPIENT = os.environ.get("MAIL_ADMIN_RECIPIENT", "admin@bedjos.co.ke")
+    # Run the outbox drainer inside each web process; otherwise run `flask bedjos send-outbox`
+    MAIL_OUTBOX_WORKER = os.environ.get("MAIL_OUTBOX_WORKER", "false").lower() == "true"
+
+    # Carts untouched for this long are deleted by `flask bedjos compact-carts` (run it from
+    # cron), or by a thread in each web process when CART_COMPACTION_WORKER is set
+    CART_EXPIRY_DAYS = int(os.environ.get("CART_EXPIRY_DAYS", 30))
+    CART_COMPACTION_WORKER = os.environ.get("CART_COMPACTION_WORKER", "false").lower() == "true"
+    CART_COMPACTION_INTERVAL_SECONDS = int(os.environ.get("CART_COMPACTION_INTERVAL_SECONDS", 3600))
+    CART_COMPACTION_BATCH_SIZE = int(os.environ.get("CART_COMPACTION_BATCH_SIZE", 500))
+
+    # Per-endpoint latency, SQL and response size metrics at /api/admin/metrics
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    # Adds app and db timings to every response, visible in browser dev tools
+    METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "true").lower() == "true"
+
+    # Shared cache for catalog, cart and stats reads: "memory" (per process), "redis"
+    # (CACHE_URL, any Redis-protocol server; needs the optional `redis` package) or
+    # "near" (a local tier in front of Redis, kept coherent with pub/sub invalidation)
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+    CACHE_URL = os.environ.get("CACHE_URL", "redis://localhost:6379/0")
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 4096))
+    CACHE_DEFAULT_TTL = int(os.environ.get("CACHE_DEFAULT_TTL", 300))
+    # With "memory", invalidations reach only the worker that wrote, so nothing is kept
+    # longer than this and carts aren't cached; use redis/near with several workers
+    CACHE_LOCAL_MAX_TTL = int(os.environ.get("CACHE_LOCAL_MAX_TTL", 5))
+    # Longest a near-cache entry may outlive a missed invalidation
+    CACHE_NEAR_TTL = int(os.environ.get("CACHE_NEAR_TTL", 5))
+
+    # Uploaded product images and their resized variants (see app/media.py). Resizing
+    # uses Pillow; IMAGE_WORKERS = 0 resizes during the upload.
+    MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(BASE_DIR, "instance", "media"))
+    MEDIA_MAX_UPLOAD_BYTES = int(os.environ.get("MEDIA_MAX_UPLOAD_MB", 10)) * 1024 * 1024
+    IMAGE_WIDTHS = tuple(int(w) for w in os.environ.get("IMAGE_WIDTHS", "320,640,1024").split(","))
+    # Width of the JPEG given as `image`, for clients that ignore `srcset`
+    IMAGE_FALLBACK_WIDTH = int(os.environ.get("IMAGE_FALLBACK_WIDTH", 640))
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 1))
+
+    # Server-sent events (/api/events). With more than one worker process, set a redis:// URL
+    # (needs the optional `redis` package) so every worker sees every event.
+    EVENTS_BROKER_URL = os.environ.get("EVENTS_BROKER_URL")
+    EVENTS_HEARTBEAT_SECONDS = 15
+    # Streams end after this long and the browser reconnects. Each open stream holds one
+    # gunicorn thread (GUNICORN_THREADS per worker) for the whole time; see gunicorn.conf.py.
+    EVENTS_MAX_STREAM_SECONDS = int(os.environ.get("EVENTS_MAX_STREAM_SECONDS", 300))
+    # Lifetime of the ticket the admin dashboard exchanges its token for to open a stream
+    EVENTS_TICKET_SECONDS = int(os.environ.get("EVENTS_TICKET_SECONDS", 60))
+
+    # Safaricom Daraja. Point MPESA_BASE_URL at fake_daraja.py to develop without the sandbox.
+    MPESA_BASE_URL = os.environ.get("MPESA_BASE_URL", "https://sandbox.safaricom.co.ke")
+    MPESA_CONSUMER_KEY = os.environ.get("MPESA_CONSUMER_KEY")
+    MPESA_CONSUMER_SECRET = os.environ.get("MPESA_CONSUMER_SECRET")
+    MPESA_SHORTCODE = os.environ.get("MPESA_SHORTCODE")
+    MPESA_PASSKEY = os.environ.get("MPESA_PASSKEY")
+    MPESA_TRANSACTION_TYPE = os.environ.get("MPESA_TRANSACTION_TYPE", "CustomerPayBillOnline")
+    # Public URL of /api/payments/mpesa/callback. Pushes are sent with ?token=MPESA_CALLBACK_TOKEN
+    # appended, and callbacks without it are rejected; both are required to take payments.
+    MPESA_CALLBACK_URL = os.environ.get("MPESA_CALLBACK_URL")
+    MPESA_CALLBACK_TOKEN = os.environ.get("MPESA_CALLBACK_TOKEN")
+    MPESA_CONNECT_TIMEOUT = float(os.environ.get("MPESA_CONNECT_TIMEOUT", 3.05))
+    MPESA_READ_TIMEOUT = float(os.environ.get("MPESA_READ_TIMEOUT", 15))
+    MPESA_POOL_SIZE = int(os.environ.get("MPESA_POOL_SIZE", 10))
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the Safaricom Daraja endpoints the backend uses.
+
+    python fake_daraja.py --port 8089 [--delay 2]
+
+Then run the backend with MPESA_BASE_URL=http://localhost:8089 and any values for
+MPESA_CONSUMER_KEY, MPESA_CONSUMER_SECRET, MPESA_SHORTCODE, MPESA_PASSKEY and
+MPESA_CALLBACK_TOKEN.
+Each STK push is answered immediately. After --delay seconds, the result is
+POSTed to its CallBackURL. Phone numbers ending in 0000 simulate a cancelled
+prompt; numbers ending in 9999 simulate insufficient funds.
+"""
+import argparse
+import secrets
+import threading
+import time
+from datetime import datetime
+
+import requests
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+TOKENS = set()
+CALLBACK_DELAY = 2.0
+
+
+@app.route("/oauth/v1/generate", methods=["GET"])
+def generate_token():
+    if request.args.get("grant_type") != "client_credentials" or not request.authorization:
+        return jsonify({"errorMessage": "Invalid credentials"}), 400
+    token = secrets.token_hex(16)
+    TOKENS.add(token)
+    return jsonify({"access_token": token, "expires_in": "3599"})
+
+
+def send_callback(url, payload):
+    time.sleep(CALLBACK_DELAY)
+    try:
+        requests.post(url, json=payload, timeout=10)
+    except requests.RequestException as e:
+        print(f"Callback to {url} failed: {e}")
+
+
+@app.route("/mpesa/stkpush/v1/processrequest", methods=["POST"])
+def stk_push():
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if token not in TOKENS:
+        return jsonify({"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"}), 401
+    data = request.get_json()
+    missing = [k for k in ("BusinessShortCode", "Password", "Timestamp", "Amount", "PhoneNumber", "CallBackURL")
+               if not data.get(k)]
+    if missing:
+        return jsonify({"errorCode": "400.002.02", "errorMessage": f"Invalid {missing[0]}"}), 400
+
+    merchant_request_id = f"{secrets.randbelow(10**5)}-{secrets.randbelow(10**8)}-1"
+    checkout_request_id = f"ws_CO_{datetime.now().strftime('%d%m%Y%H%M%S')}{secrets.token_hex(4)}"
+    phone = str(data["PhoneNumber"])
+    if phone.endswith("0000"):
+        result = {"ResultCode": 1032, "ResultDesc": "Request cancelled by user"}
+    elif phone.endswith("9999"):
+        result = {"ResultCode": 1, "ResultDesc": "The balance is insufficient for the transaction"}
+    else:
+        result = {
+            "ResultCode": 0,
+            "ResultDesc": "The service request is processed successfully.",
+            "CallbackMetadata": {"Item": [
+                {"Name": "Amount", "Value": data["Amount"]},
+                {"Name": "MpesaReceiptNumber", "Value": "FAKE" + secrets.token_hex(3).upper()},
+                {"Name": "TransactionDate", "Value": int(datetime.now().strftime("%Y%m%d%H%M%S"))},
+                {"Name": "PhoneNumber", "Value": int(phone)},
+            ]},
+        }
+    callback = {"Body": {"stkCallback": {
+        "MerchantRequestID": merchant_request_id,
+        "CheckoutRequestID": checkout_request_id,
+        **result,
+    }}}
+    threading.Thread(target=send_callback, args=(data["CallBackURL"], callback), daemon=True).start()
+
+    return jsonify({
+        "MerchantRequestID": merchant_request_id,
+        "CheckoutRequestID": checkout_request_id,
+        "ResponseCode": "0",
+        "ResponseDescription": "Success. Request accepted for processing",
+        "CustomerMessage": "Success. Request accepted for processing",
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Daraja server for local development")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=CALLBACK_DELAY, help="Seconds before the callback")
+    args = parser.parse_args()
+    CALLBACK_DELAY = args.delay
+    app.run(port=args.port, threaded=True)
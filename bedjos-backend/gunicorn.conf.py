@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threads, so idle /api/events streams don't each hold a whole worker process.
+# Still, every open stream occupies one thread for up to EVENTS_MAX_STREAM_SECONDS
+# (300 s by default), so a worker serves at most `threads` streams and ordinary
+# requests combined: with N admin dashboards and payment pages open, keep
+# workers * threads comfortably above N.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+
+def on_starting(server):
+    """Check the schema once, in the master, instead of in every worker boot."""
+    from app.schema import SchemaOutOfDate, check_schema_at
+    from config import Config
+
+    # No create_app() here: the master must not open pooled connections or start
+    # the outbox/compaction threads, which forked workers would inherit
+    try:
+        check_schema_at(Config.SQLALCHEMY_DATABASE_URI)
+    except SchemaOutOfDate as e:
+        server.log.error(str(e))
+        sys.exit(1)
+
+    if server.cfg.workers > 1 and not Config.EVENTS_BROKER_URL:
+        server.log.warning(
+            "EVENTS_BROKER_URL is not set: with %d workers, /api/events subscribers only see "
+            "events published by their own worker. Point it at Redis.", server.cfg.workers
+        )
+    if server.cfg.workers > 1 and Config.CACHE_BACKEND == "memory":
+        server.log.warning(
+            "CACHE_BACKEND is \"memory\": each of the %d workers caches on its own, so cached "
+            "reads live at most CACHE_LOCAL_MAX_TTL seconds and every authenticated request "
+            "still queries the token blocklist. Use \"redis\" or \"near\".", server.cfg.workers
+        )
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s booted", worker.pid)
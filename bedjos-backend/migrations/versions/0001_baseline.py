@@ -0,0 +1,99 @@
+"""Baseline schema
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() before migrations existed already have
+    # these tables; only create what is missing so they can be upgraded in place.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'product' not in existing:
+        op.create_table(
+            'product',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.Column('image', sa.String(length=255), nullable=True),
+            sa.Column('category', sa.String(length=100), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'order' not in existing:
+        op.create_table(
+            'order',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('customer_name', sa.String(length=120), nullable=False),
+            sa.Column('phone', sa.String(length=20), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=True),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.Column('status', sa.String(length=50), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'admin' not in existing:
+        op.create_table(
+            'admin',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email')
+        )
+    if 'cart_item' not in existing:
+        op.create_table(
+            'cart_item',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('session_id', sa.String(length=120), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'customer' not in existing:
+        op.create_table(
+            'customer',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+            sa.Column('password_hash', sa.String(length=255), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email')
+        )
+    if 'contact_message' not in existing:
+        op.create_table(
+            'contact_message',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+            sa.Column('message', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('contact_message')
+    op.drop_table('customer')
+    op.drop_table('cart_item')
+    op.drop_table('admin')
+    op.drop_table('order')
+    op.drop_table('product')
@@ -0,0 +1,177 @@
+"""Stock, order items, idempotency keys, email outbox, stats rollups, cart index and product search
+
+Revision ID: 0002_orders_outbox_rollups
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_orders_outbox_rollups'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+PRODUCT_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, description, category,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description, category ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO product_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END
+    """,
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+
+    if 'stock' not in {c['name'] for c in inspector.get_columns('product')}:
+        op.add_column('product', sa.Column('stock', sa.Integer(), nullable=True))
+
+    if 'order_item' not in existing:
+        op.create_table(
+            'order_item',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['order_id'], ['order.id']),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_order_item_order_id', 'order_item', ['order_id'])
+
+    if 'idempotency_key' not in existing:
+        op.create_table(
+            'idempotency_key',
+            sa.Column('key', sa.String(length=64), nullable=False),
+            sa.Column('request_hash', sa.String(length=32), nullable=False),
+            sa.Column('status_code', sa.Integer(), nullable=True),
+            sa.Column('response', sa.LargeBinary(), nullable=True),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('key')
+        )
+        op.create_index('ix_idempotency_key_expires_at', 'idempotency_key', ['expires_at'])
+
+    if 'email_outbox' not in existing:
+        op.create_table(
+            'email_outbox',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('recipient', sa.String(length=255), nullable=False),
+            sa.Column('reply_to', sa.String(length=120), nullable=True),
+            sa.Column('subject', sa.String(length=255), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+            sa.Column('claimed_by', sa.String(length=32), nullable=True),
+            sa.Column('locked_until', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_email_outbox_next_attempt_at', 'email_outbox', ['next_attempt_at'])
+
+    if 'daily_stats' not in existing:
+        op.create_table(
+            'daily_stats',
+            sa.Column('day', sa.String(length=10), nullable=False),
+            sa.Column('order_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('pending_count', sa.Integer(), nullable=False),
+            sa.Column('product_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('day')
+        )
+
+    op.create_index('ix_order_created_at', 'order', ['created_at'], if_not_exists=True)
+
+    # Merge duplicate cart lines into the oldest row before enforcing one row per product
+    if 'uq_cart_item_session_product' not in {i['name'] for i in inspector.get_indexes('cart_item')}:
+        op.execute("""
+            UPDATE cart_item SET quantity = (
+                SELECT SUM(dup.quantity) FROM cart_item AS dup
+                WHERE dup.session_id = cart_item.session_id
+                  AND dup.product_id = cart_item.product_id
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM cart_item
+                GROUP BY session_id, product_id HAVING COUNT(*) > 1
+            )
+        """)
+        op.execute("""
+            DELETE FROM cart_item WHERE id NOT IN (
+                SELECT MIN(id) FROM cart_item GROUP BY session_id, product_id
+            )
+        """)
+        op.create_index(
+            'uq_cart_item_session_product', 'cart_item', ['session_id', 'product_id'], unique=True
+        )
+
+    if bind.dialect.name == 'sqlite':
+        has_fts = 'product_fts' in existing
+        for statement in PRODUCT_SEARCH_DDL:
+            op.execute(statement)
+        if not has_fts:
+            op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+    # Seed the dashboard rollups from existing orders and products
+    if not bind.execute(sa.text("SELECT 1 FROM daily_stats WHERE day = 'all'")).first():
+        op.execute("DELETE FROM daily_stats")
+        op.execute("""
+            INSERT INTO daily_stats (day, order_count, revenue, pending_count, product_count)
+            SELECT CAST(date(created_at) AS VARCHAR(10)), COUNT(id), COALESCE(SUM(total), 0),
+                   SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0
+            FROM "order" GROUP BY CAST(date(created_at) AS VARCHAR(10))
+        """)
+        op.execute("""
+            INSERT INTO daily_stats (day, order_count, revenue, pending_count, product_count)
+            SELECT 'all',
+                   (SELECT COUNT(id) FROM "order"),
+                   (SELECT COALESCE(SUM(total), 0) FROM "order"),
+                   (SELECT COUNT(id) FROM "order" WHERE status = 'pending'),
+                   (SELECT COUNT(id) FROM product)
+        """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for name in ('product_fts_au', 'product_fts_ad', 'product_fts_ai'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS product_fts")
+    op.drop_index('uq_cart_item_session_product', table_name='cart_item')
+    op.drop_index('ix_order_created_at', table_name='order')
+    op.drop_table('daily_stats')
+    op.drop_index('ix_email_outbox_next_attempt_at', table_name='email_outbox')
+    op.drop_table('email_outbox')
+    op.drop_index('ix_idempotency_key_expires_at', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
+    op.drop_index('ix_order_item_order_id', table_name='order_item')
+    op.drop_table('order_item')
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_column('stock')
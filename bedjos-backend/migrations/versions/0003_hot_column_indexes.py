@@ -0,0 +1,29 @@
+"""Index hot filter columns
+
+Revision ID: 0003_hot_column_indexes
+Revises: 0002_orders_outbox_rollups
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_column_indexes'
+down_revision = '0002_orders_outbox_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # cart_item.session_id lookups are served by the leading column of
+    # uq_cart_item_session_product, so it needs no index of its own.
+    op.create_index('ix_order_status', 'order', ['status'], if_not_exists=True)
+    op.create_index('ix_product_category', 'product', ['category'], if_not_exists=True)
+    op.create_index('ix_contact_message_created_at', 'contact_message', ['created_at'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_contact_message_created_at', table_name='contact_message')
+    op.drop_index('ix_product_category', table_name='product')
+    op.drop_index('ix_order_status', table_name='order')
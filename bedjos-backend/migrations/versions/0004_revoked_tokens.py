@@ -0,0 +1,32 @@
+"""Revoked JWT blocklist
+
+Revision ID: 0004_revoked_tokens
+Revises: 0003_hot_column_indexes
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_revoked_tokens'
+down_revision = '0003_hot_column_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'revoked_token' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'revoked_token',
+            sa.Column('jti', sa.String(length=36), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('jti')
+        )
+        op.create_index('ix_revoked_token_expires_at', 'revoked_token', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_revoked_token_expires_at', table_name='revoked_token')
+    op.drop_table('revoked_token')
@@ -0,0 +1,44 @@
+"""M-Pesa payments
+
+Revision ID: 0005_payments
+Revises: 0004_revoked_tokens
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_payments'
+down_revision = '0004_revoked_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'payment' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'payment',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('checkout_request_id', sa.String(length=64), nullable=False),
+            sa.Column('merchant_request_id', sa.String(length=64), nullable=True),
+            sa.Column('phone', sa.String(length=20), nullable=False),
+            sa.Column('amount', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('result_code', sa.Integer(), nullable=True),
+            sa.Column('result_desc', sa.String(length=255), nullable=True),
+            sa.Column('receipt_number', sa.String(length=32), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['order_id'], ['order.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('checkout_request_id')
+        )
+        op.create_index('ix_payment_order_id', 'payment', ['order_id'])
+
+
+def downgrade():
+    op.drop_index('ix_payment_order_id', table_name='payment')
+    op.drop_table('payment')
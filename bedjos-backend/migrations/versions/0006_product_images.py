@@ -0,0 +1,31 @@
+"""Uploaded product images
+
+Revision ID: 0006_product_images
+Revises: 0005_payments
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_product_images'
+down_revision = '0005_payments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('product')}
+    if 'image_hash' not in columns:
+        op.add_column('product', sa.Column('image_hash', sa.String(length=64), nullable=True))
+    if 'srcset' not in columns:
+        op.add_column('product', sa.Column('srcset', sa.Text(), nullable=True))
+
+
+def downgrade():
+    # Plain DROP COLUMN (SQLite 3.35+) rather than a batch rebuild, which would
+    # drop the product_fts triggers along with the old table
+    op.drop_column('product', 'srcset')
+    op.drop_column('product', 'image_hash')
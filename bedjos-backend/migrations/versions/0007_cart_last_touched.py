@@ -0,0 +1,30 @@
+"""Track cart activity for expiry
+
+Revision ID: 0007_cart_last_touched
+Revises: 0006_product_images
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_cart_last_touched'
+down_revision = '0006_product_images'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'last_touched' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('cart_item')}:
+        # SQLite can't add a column with a CURRENT_TIMESTAMP default, so backfill instead;
+        # existing carts count as touched when they were created
+        op.add_column('cart_item', sa.Column('last_touched', sa.DateTime(), nullable=True))
+        op.execute("UPDATE cart_item SET last_touched = COALESCE(created_at, CURRENT_TIMESTAMP)")
+    op.create_index('ix_cart_item_last_touched', 'cart_item', ['last_touched'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_cart_item_last_touched', table_name='cart_item')
+    op.drop_column('cart_item', 'last_touched')
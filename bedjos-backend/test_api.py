@@ -58,6 +58,10 @@ try:
     print(f"Status: {response.status_code}")
     products = response.json()
     print(f"Found {len(products)} products")
+
+    response = requests.get(f"{BASE_URL}/products",
+                            headers={"If-None-Match": response.headers.get("ETag", "")})
+    print(f"Conditional GET: {response.status_code} (expected 304)")
 except Exception as e:
     print(f"❌ Error: {e}")
 
@@ -68,7 +72,7 @@ try:
         "customer_name": "John Doe",
         "phone": "0712345678",
         "email": "john@example.com",
-        "total": 1500.00
+        "items": [{"product_id": 1, "quantity": 1}]
     }
     response = requests.post(f"{BASE_URL}/orders", json=order_data)
     print(f"Status: {response.status_code}")
@@ -112,9 +116,10 @@ except Exception as e:
 # 8. M-Pesa Payment
 print("\n8. Testing M-Pesa Payment...")
 try:
+    # Needs MPESA_* settings (see fake_daraja.py); otherwise the API answers 503
     mpesa_data = {
         "phone": "0712345678",
-        "amount": 1500
+        "order_id": 1
     }
     response = requests.post(f"{BASE_URL}/payments/mpesa/stk-push", json=mpesa_data)
     print(f"Status: {response.status_code}")
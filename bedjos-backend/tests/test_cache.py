@@ -0,0 +1,197 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import cache as cache_module
+from app.cache import (
+    MemoryCache, NearCache, bump_generation, bump_generation_after_commit, generation, invalidate_after_commit
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRemote:
+    """The part of RedisCache that NearCache uses, with pub/sub delivered synchronously."""
+
+    shared = True
+
+    def __init__(self):
+        self.store = {}
+        self.listeners = []
+        self.down = False
+
+    def get(self, key):
+        return None if self.down else self.store.get(key)
+
+    def set(self, key, value, ttl=None):
+        if not self.down:
+            self.store[key] = value
+
+    def delete(self, *keys):
+        if not self.down:
+            for key in keys:
+                self.store.pop(key, None)
+
+    def incr(self, key):
+        if self.down:
+            return None
+        value = int(self.store.get(key, b"0")) + 1
+        self.store[key] = str(value).encode("ascii")
+        return value
+
+    def publish(self, channel, message):
+        if not self.down:
+            for listener_channel, callback in self.listeners:
+                if listener_channel == channel:
+                    callback(message)
+
+    def listen(self, channel, callback):
+        self.listeners.append((channel, callback))
+
+    def stats(self):
+        return {"backend": "fake"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def process_cache(monkeypatch):
+    """Stand in for get_cache(), which would otherwise build one from the app config."""
+    cache = MemoryCache()
+    monkeypatch.setattr(cache_module, "_cache", cache)
+    return cache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"  # a is now the most recently used
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_never_drops_counters():
+    cache = MemoryCache(max_entries=1)
+    cache.incr("gen:catalog")
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("gen:catalog") == b"1"
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = MemoryCache(default_ttl=60)
+    cache.set("short", b"1", ttl=10)
+    cache.set("default", b"2")
+    cache.set("forever", b"3", ttl=0)
+
+    clock.now += 11
+    assert cache.get("short") is None
+    assert cache.get("default") == b"2"
+
+    clock.now += 3600
+    assert cache.get("default") is None
+    assert cache.get("forever") == b"3"
+    assert cache.stats()["expirations"] == 2
+
+
+def test_max_ttl_caps_every_entry(clock):
+    cache = MemoryCache(default_ttl=3600, max_ttl=5)
+    cache.set("long", b"1", ttl=3600)
+    cache.set("forever", b"2", ttl=0)
+    clock.now += 6
+    assert cache.get("long") is None
+    assert cache.get("forever") is None
+
+
+def test_bumping_a_generation_changes_it(process_cache):
+    assert generation("catalog") == 0
+    assert bump_generation("catalog") == 1
+    assert generation("catalog") == 1
+    assert generation("stats") == 0
+
+
+def test_invalidation_waits_for_commit(process_cache):
+    session = Session(create_engine("sqlite://"))
+    process_cache.set("cart:1", b"old")
+    process_cache.set("cart:2", b"old")
+
+    invalidate_after_commit(session, "cart:1")
+    assert process_cache.get("cart:1") == b"old"
+    session.commit()
+    assert process_cache.get("cart:1") is None
+
+    # A transaction that rolls back before it has touched the database
+    session.begin()
+    invalidate_after_commit(session, "cart:2")
+    session.rollback()
+    session.commit()
+    assert process_cache.get("cart:2") == b"old"
+
+
+def test_generation_bumps_wait_for_commit(process_cache):
+    session = Session(create_engine("sqlite://"))
+    bump_generation_after_commit(session, "analytics:status", "analytics:total")
+    assert generation("analytics:status") == 0
+    session.commit()
+    assert generation("analytics:status") == generation("analytics:total") == 1
+
+    session.begin()
+    bump_generation_after_commit(session, "analytics:status")
+    session.rollback()
+    session.commit()
+    assert generation("analytics:status") == 1
+
+
+def test_near_cache_invalidates_other_processes():
+    remote = FakeRemote()
+    a = NearCache(MemoryCache(), remote, local_ttl=60)
+    b = NearCache(MemoryCache(), remote, local_ttl=60)
+
+    a.set("product:1", b"v1")
+    assert b.get("product:1") == b"v1"  # now also held in b's local tier
+
+    a.set("product:1", b"v2")
+    assert b.get("product:1") == b"v2"
+
+    a.delete("product:1")
+    assert b.get("product:1") is None
+
+
+def test_near_cache_generations_are_shared():
+    remote = FakeRemote()
+    a = NearCache(MemoryCache(), remote, local_ttl=60)
+    b = NearCache(MemoryCache(), remote, local_ttl=60)
+
+    assert b.get("gen:catalog") is None
+    a.incr("gen:catalog")
+    assert b.get("gen:catalog") == b"1"
+    b.incr("gen:catalog")
+    assert a.get("gen:catalog") == b"2"
+
+
+def test_near_cache_serves_local_tier_while_remote_is_down(clock):
+    remote = FakeRemote()
+    cache = NearCache(MemoryCache(), remote, local_ttl=5)
+    cache.set("product:1", b"v1")
+
+    remote.down = True
+    assert cache.get("product:1") == b"v1"
+    assert cache.incr("gen:catalog") is None
+    clock.now += 6
+    assert cache.get("product:1") is None
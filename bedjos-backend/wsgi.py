@@ -0,0 +1,5 @@
+# WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# (app.py can't be imported as a module; the app/ package shadows it.)
+from app import create_app
+
+app = create_app()
@@ -27,6 +27,7 @@ export default function Navbar() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('customer_token')}`,
         },
       });
     } catch (error) {
@@ -45,6 +46,7 @@ export default function Navbar() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('admin_token')}`,
         },
       });
     } catch (error) {
@@ -2,12 +2,16 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import './AdminDashboard.css';
 
+const PAGE_SIZE = 50;
+
 const AdminDashboard = () => {
   const [activeTab, setActiveTab] = useState('overview');
   const [stats, setStats] = useState({});
   const [products, setProducts] = useState([]);
   const [orders, setOrders] = useState([]);
   const [messages, setMessages] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
+  const [messagesCursor, setMessagesCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [newProduct, setNewProduct] = useState({
     name: '',
@@ -23,6 +27,53 @@ const AdminDashboard = () => {
     loadDashboardData();
   }, []);
 
+  // Live order updates over server-sent events instead of re-fetching the lists
+  useEffect(() => {
+    let source = null;
+    let retry = null;
+    let stopped = false;
+
+    // EventSource can't send the Authorization header, so each connection uses a
+    // short-lived ticket; a dropped stream reconnects with a fresh one
+    const connect = async () => {
+      const token = localStorage.getItem('admin_token');
+      if (!token || stopped) return;
+      try {
+        const response = await fetch('/api/events/ticket', {
+          method: 'POST',
+          headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (!response.ok || stopped) return;
+        const { ticket } = await response.json();
+        source = new EventSource(`/api/events?topics=orders&ticket=${encodeURIComponent(ticket)}`);
+      } catch (error) {
+        retry = setTimeout(connect, 5000);
+        return;
+      }
+      source.addEventListener('order.created', (event) => {
+        const order = JSON.parse(event.data);
+        setOrders((current) => (current.some((o) => o.id === order.id) ? current : [order, ...current]));
+        loadStats();
+      });
+      source.addEventListener('order.updated', (event) => {
+        const order = JSON.parse(event.data);
+        setOrders((current) => current.map((o) => (o.id === order.id ? { ...o, ...order } : o)));
+        loadStats();
+      });
+      source.onerror = () => {
+        source.close();
+        retry = setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, []);
+
   const checkAuth = () => {
     const token = localStorage.getItem('admin_token');
     if (!token) {
@@ -31,17 +82,21 @@ const AdminDashboard = () => {
     }
   };
 
+  // Stats are precomputed rollups, so refreshing them is cheap
+  const loadStats = async () => {
+    const token = localStorage.getItem('admin_token');
+    const response = await fetch('/api/admin/stats', { headers: { 'Authorization': `Bearer ${token}` } });
+    if (response.ok) {
+      setStats(await response.json());
+    }
+  };
+
   const loadDashboardData = async () => {
     try {
       const token = localStorage.getItem('admin_token');
       const headers = { 'Authorization': `Bearer ${token}` };
 
-      // Load stats
-      const statsResponse = await fetch('/api/admin/stats', { headers });
-      if (statsResponse.ok) {
-        const statsData = await statsResponse.json();
-        setStats(statsData);
-      }
+      await loadStats();
 
       // Load products
       const productsResponse = await fetch('/api/products');
@@ -50,18 +105,19 @@ const AdminDashboard = () => {
         setProducts(productsData);
       }
 
-      // Load orders
-      const ordersResponse = await fetch('/api/admin/orders', { headers });
+      // Load the first page of orders and messages; older ones load on demand
+      const ordersResponse = await fetch(`/api/admin/orders?limit=${PAGE_SIZE}`, { headers });
       if (ordersResponse.ok) {
         const ordersData = await ordersResponse.json();
-        setOrders(ordersData);
+        setOrders(ordersData.items);
+        setOrdersCursor(ordersData.next_cursor);
       }
 
-      // Load messages
-      const messagesResponse = await fetch('/api/admin/messages', { headers });
+      const messagesResponse = await fetch(`/api/admin/messages?limit=${PAGE_SIZE}`, { headers });
       if (messagesResponse.ok) {
         const messagesData = await messagesResponse.json();
-        setMessages(messagesData);
+        setMessages(messagesData.items);
+        setMessagesCursor(messagesData.next_cursor);
       }
 
     } catch (error) {
@@ -70,6 +126,23 @@ const AdminDashboard = () => {
     setLoading(false);
   };
 
+  const loadMore = async (resource, cursor, setItems, setCursor) => {
+    try {
+      const token = localStorage.getItem('admin_token');
+      const response = await fetch(
+        `/api/admin/${resource}?limit=${PAGE_SIZE}&cursor=${encodeURIComponent(cursor)}`,
+        { headers: { 'Authorization': `Bearer ${token}` } }
+      );
+      if (response.ok) {
+        const data = await response.json();
+        setItems(prev => [...prev, ...data.items]);
+        setCursor(data.next_cursor);
+      }
+    } catch (error) {
+      console.error(`Error loading more ${resource}:`, error);
+    }
+  };
+
   const handleAddProduct = async (e) => {
     e.preventDefault();
     try {
@@ -113,7 +186,8 @@ const AdminDashboard = () => {
         loadDashboardData(); // Reload products
         alert('Product deleted successfully!');
       } else {
-        alert('Failed to delete product');
+        const data = await response.json().catch(() => ({}));
+        alert(data.error || 'Failed to delete product');
       }
     } catch (error) {
       console.error('Error deleting product:', error);
@@ -134,7 +208,9 @@ const AdminDashboard = () => {
       });
 
       if (response.ok) {
-        loadDashboardData(); // Reload orders
+        // The order.updated event refreshes other open dashboards; update this one directly
+        setOrders((current) => current.map((o) => (o.id === orderId ? { ...o, status: newStatus } : o)));
+        loadStats();
         alert('Order status updated!');
       } else {
         alert('Failed to update order status');
@@ -146,6 +222,11 @@ const AdminDashboard = () => {
   };
 
   const handleLogout = () => {
+    // Revoke the token server-side; the local logout doesn't wait for it
+    fetch('/api/auth/logout', {
+      method: 'POST',
+      headers: { 'Authorization': `Bearer ${localStorage.getItem('admin_token')}` }
+    }).catch((error) => console.error('Logout error:', error));
     localStorage.removeItem('admin_token');
     localStorage.removeItem('admin_info');
     navigate('/admin/login');
@@ -180,7 +261,7 @@ const AdminDashboard = () => {
             className={activeTab === 'orders' ? 'active' : ''}
             onClick={() => setActiveTab('orders')}
           >
-            Orders ({orders.length})
+            Orders ({stats.total_orders ?? orders.length})
           </button>
           <button
             className={activeTab === 'messages' ? 'active' : ''}
@@ -271,6 +352,14 @@ const AdminDashboard = () => {
                   </div>
                 ))}
               </div>
+              {ordersCursor && (
+                <button
+                  className="load-more-btn"
+                  onClick={() => loadMore('orders', ordersCursor, setOrders, setOrdersCursor)}
+                >
+                  Load more orders
+                </button>
+              )}
             </div>
           )}
 
@@ -291,6 +380,14 @@ const AdminDashboard = () => {
                   </div>
                 ))}
               </div>
+              {messagesCursor && (
+                <button
+                  className="load-more-btn"
+                  onClick={() => loadMore('messages', messagesCursor, setMessages, setMessagesCursor)}
+                >
+                  Load more messages
+                </button>
+              )}
             </div>
           )}
 
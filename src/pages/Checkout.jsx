@@ -6,6 +6,8 @@ import './Checkout.css';
 export default function Checkout() {
   const { cart, total, clearCart } = useCart();
   const [formData, setFormData] = useState({ customer_name: '', email: '', phone: '' });
+  // One key per checkout attempt, so retried submissions don't create duplicate orders
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
   const navigate = useNavigate();
 
   const handleChange = (e) => {
@@ -17,12 +19,12 @@ export default function Checkout() {
     try {
       const response = await fetch('/api/orders', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
         body: JSON.stringify({
           customer_name: formData.customer_name,
           phone: formData.phone,
           email: formData.email,
-          total: total
+          items: cart.map((item) => ({ product_id: item.id, quantity: item.quantity }))
         }),
       });
       if (response.ok) {
@@ -30,6 +32,8 @@ export default function Checkout() {
         alert('Order placed successfully!');
         navigate('/');
       } else {
+        // Nothing was ordered; the next submission (maybe with a changed cart) is a new attempt
+        setIdempotencyKey(crypto.randomUUID());
         const errorData = await response.json();
         alert(`Error placing order: ${errorData.error || 'Unknown error'}`);
       }
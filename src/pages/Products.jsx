@@ -45,7 +45,14 @@ export default function Products() {
       <div className="products-grid">
         {products.map(product => (
           <div key={product.id} className="product-card glass">
-            <img src={product.image_url || '/images/placeholder.jpg'} alt={product.name} className="product-img" />
+            <img
+              src={product.image || product.image_url || '/images/placeholder.jpg'}
+              srcSet={product.srcset || undefined}
+              sizes="(max-width: 600px) 100vw, 320px"
+              loading="lazy"
+              alt={product.name}
+              className="product-img"
+            />
             <div className="product-info">
               <h3>{product.name}</h3>
               <p>{product.description}</p>
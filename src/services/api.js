@@ -202,11 +202,12 @@ class ApiService {
     }
 
     // Payments
-    async initiateMpesaPayment(phone, amount) {
+    // The amount is the order's total, computed by the server
+    async initiateMpesaPayment(orderId, phone) {
         const response = await fetch(`${this.baseUrl}/payments/mpesa/stk-push`, {
             method: 'POST',
             headers: this.getCustomerHeaders(),
-            body: JSON.stringify({ phone, amount })
+            body: JSON.stringify({ order_id: orderId, phone })
         });
         return response.json();
     }